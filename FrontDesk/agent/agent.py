@@ -35,26 +35,34 @@ def make_call(question: str):
         print("Create failed:", r.status_code, r.text)    
 
 
-def poll_requests():
-    r = requests.get(f"{BACKEND}/help-requests")
-    if r.ok:
-        items = r.json()
-        print("All help requests:")
-        for it in items:
-            print(it)
-    else:
-        print("Failed to fetch requests", r.text)
-
-
-def poll_learned():
-    r = requests.get(f"{BACKEND}/learned-answers")
-    if r.ok:
-        items = r.json()
-        print("Learned answers:")
-        for it in items:
-            print(it)
-    else:
-        print("No learned answers yet.")
+# Local mirror of the backend tables, kept current from GET /changes
+mirror = {"cursor": 0, "help_requests": {}, "learned_answers": {}}
+MIRROR_TABLES = {"helprequest": "help_requests", "knowledgebase": "learned_answers"}
+
+
+def poll_changes():
+    """Apply every change since the last poll to `mirror`; prints only what changed."""
+    while True:
+        r = requests.get(f"{BACKEND}/changes", params={"since": mirror["cursor"]})
+        if not r.ok:
+            print("Failed to fetch changes", r.text)
+            return
+        feed = r.json()
+        for table in ("help_requests", "learned_answers"):
+            for row in feed[table]:
+                print(f"{'Updated' if row['id'] in mirror[table] else 'New'} {table[:-1].replace('_', ' ')}:", row)
+                mirror[table][row["id"]] = row
+        for gone in feed["deleted"]:
+            table = MIRROR_TABLES.get(gone["table"])
+            if not table:
+                continue
+            # help request ids are ints in the mirror; tombstones carry string ids
+            key = int(gone["id"]) if table == "help_requests" else gone["id"]
+            if mirror[table].pop(key, None) is not None:
+                print(f"Deleted {gone['table']} {gone['id']}")
+        mirror["cursor"] = feed["cursor"]
+        if not feed["has_more"]:
+            return
 
 
 if __name__ == "__main__":
@@ -62,8 +70,8 @@ if __name__ == "__main__":
     make_call("Do you offer eyelash extensions?")
     make_call("What are your hours?")
 
-    # Poll for updates a few times to show workflow
+    # Poll for updates a few times to show workflow (only deltas are transferred)
     for i in range(8):
-        poll_requests()
-        poll_learned()
+        poll_changes()
+        print(f"Mirror: {len(mirror['help_requests'])} help requests, {len(mirror['learned_answers'])} learned answers")
         time.sleep(4)
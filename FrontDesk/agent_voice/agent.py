@@ -1,10 +1,10 @@
 
 
-from .speech import listen, speak
+from .speech import listen, speak, stop_speaking
+from .tts import KBPrerenderer, TTS_PRERENDER, get_audio_cache, kb_answer_text
 import requests
 import os
 from dotenv import load_dotenv
-import re
 
 
 
@@ -15,39 +15,29 @@ BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 def backend_url(path: str) -> str:
     return BACKEND_URL.rstrip("/") + path
 
-
-def kb_search(query: str, top_k: int = 3):
-    """Query the backend KB for possible answers."""
-    try:
-        r = requests.get(backend_url("/kb/search"), params={"q": query, "top_k": top_k}, timeout=8)
-        r.raise_for_status()
-        return r.json()
-    except Exception as e:
-        print(f"❌ KB search failed: {e}")
-        return []
+# fixed agent phrases, rendered ahead of time along with the KB answers
+SAY_GOODBYE = "Goodbye!"
+SAY_BACKEND_DOWN = "Sorry, I'm having trouble reaching the front desk system. Please try again."
+SAY_NO_KB_ANSWER = "I couldn't find an answer in the knowledge base. Sending your question to the supervisor."
+SAY_ESCALATING = "I'm not sure about the answer. Sending your question to the supervisor."
+AGENT_PHRASES = [SAY_GOODBYE, SAY_BACKEND_DOWN, SAY_NO_KB_ANSWER, SAY_ESCALATING]
 
 
-def create_help_request(caller_name: str, question: str):
-    """Send unresolved questions to backend."""
+def ask_backend(caller_name: str, question: str):
+    """
+    One backend call per caller turn: KB search, relevance check and escalation
+    all happen server-side. Returns {"decision": "answer"|"escalated", ...} or None.
+    """
     try:
         payload = {"caller_name": caller_name, "question": question}
-        r = requests.post(backend_url("/help-requests"), json=payload, timeout=8)
+        r = requests.post(backend_url("/agent/ask"), json=payload, timeout=8)
         r.raise_for_status()
         return r.json()
     except Exception as e:
-        print(f"❌ Failed to create help request: {e}")
+        print(f"❌ Backend ask failed: {e}")
         return None
 
 
-def is_relevant(user_q, kb_q):
-    """Simple relevance check based on common keywords."""
-    user_words = set(re.findall(r"\w+", user_q.lower()))
-    kb_words = set(re.findall(r"\w+", kb_q.lower()))
-    stopwords = {"the", "is", "and", "a", "an", "to", "for", "in", "of", "on", "are", "you", "we", "do", "have"}
-    overlap = (user_words - stopwords) & (kb_words - stopwords)
-    return len(overlap) >= 2  # at least 2 common keywords = relevant
-
-
 # def run_voice_agent():
 #     caller_name = input("Enter your name: ")
 #     speak(f"Hello {caller_name}, how can I help you today?")
@@ -85,6 +75,8 @@ def is_relevant(user_q, kb_q):
 
 # inside agent_voice/agent.py (only the loop shown; replace your current loop body)
 def run_voice_agent():
+    if TTS_PRERENDER:
+        KBPrerenderer(BACKEND_URL, get_audio_cache(), phrases=AGENT_PHRASES).start()
     caller_name = input("Enter your name: ")
     speak(f"Hello {caller_name}, how can I help you today?")
 
@@ -97,35 +89,29 @@ def run_voice_agent():
         question = question.strip()
         if not question:
             continue
+        # barge-in: the caller spoke over the previous reply, so drop what is left of it
+        stop_speaking()
 
         if "exit" in question.lower():
-            speak("Goodbye!")
+            speak(SAY_GOODBYE).result()  # playback is a daemon thread; let it finish before exiting
             break
 
         print(f"🔍 Searching KB for: {question}")
-        kb_results = kb_search(question, top_k=3)
-
-        if not kb_results:
-            speak("I couldn't find an answer in the knowledge base. Sending your question to the supervisor.")
-            create_help_request(caller_name, question)
+        result = ask_backend(caller_name, question)
+        if result is None:
+            speak(SAY_BACKEND_DOWN)
             continue
 
-        top = kb_results[0]
-        top_score = top.get("score", 0)
-        top_question = top.get("question_pattern", "")
-        top_answer = top.get("answer", "")
-
-        # Adjust confidence threshold as needed
-        kb_cutoff = 0.75
-        if top_score >= kb_cutoff and is_relevant(question, top_question):
+        top_score = (result.get("kb_match") or result.get("kb_suggestion") or {}).get("score", 0)
+        if result.get("decision") == "answer":
             print(f"✅ Confident KB match (score={top_score:.2f})")
             # speak the answer (speech.speak handles chunking)
-            speak(f"Here's what I found: {top_answer}")
+            speak(kb_answer_text(result.get('answer', '')))
+        elif not result.get("suggestions"):
+            speak(SAY_NO_KB_ANSWER)
         else:
-            print(f"⚠️ Low confidence (score={top_score:.2f}). Escalating.")
-            speak("I'm not sure about the answer. Sending your question to the supervisor.")
-            create_help_request(caller_name, question)
-
+            print(f"⚠️ Low confidence (score={top_score:.2f}). Escalated as request {result.get('id')}.")
+            speak(SAY_ESCALATING)
 
 
 if __name__ == "__main__":
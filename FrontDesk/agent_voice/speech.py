@@ -1,39 +1,207 @@
 import os
-import tempfile
+import queue
+import statistics
 import threading
-from gtts import gTTS
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
 import pygame
 
-_tts_lock = threading.Lock()
+from .tts import get_audio_cache, utterance_chunks
 
-def speak(text: str):
-    """Use gTTS to generate and play speech (works inside Docker)."""
-    if not text or not text.strip():
-        return
+# One long-lived playback thread per process: the mixer is opened once and
+# stays open, utterances play in the order they were spoken, and callers get
+# a Future for each one (result True when it played to the end, False when it
+# was cut off by barge-in; cancelled if it never started).
+#
+# Synthesis is pipelined with playback: speak() splits the text into sentences
+# (TTS_STREAMING) and queues their renders at once on a render thread, so
+# sentence N+1, and the next utterance, are synthesized while sentence N plays.
+PLAYBACK_QUEUE_SIZE = int(os.getenv("PLAYBACK_QUEUE_SIZE", "8"))  # utterances waiting to play
+PLAYBACK_POLL_SECONDS = 0.02  # how quickly a playing utterance notices barge-in
+# print each utterance's time to first audio
+TTS_TIMING_LOG = os.getenv("TTS_TIMING_LOG", "false").lower() in ("1", "true", "yes")
 
-    def _worker():
-        with _tts_lock:
-            try:
-                # Generate speech as temporary MP3 file
-                tts = gTTS(text=text, lang='en')
-                tmpfile = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-                tts.save(tmpfile.name)
-                tmpfile.close()
 
-                # Initialize pygame mixer for playback
-                pygame.mixer.init()
-                pygame.mixer.music.load(tmpfile.name)
-                pygame.mixer.music.play()
+class Utterance:
+    def __init__(self, text: str, generation: int, stream: Optional[bool] = None):
+        self.text = text
+        self.generation = generation
+        self.chunks = utterance_chunks(text, stream)
+        self.renders = []  # one Future per chunk, resolving to the rendered file
+        self.future: Future = Future()
+        # time to first audio: from the moment the player is free for this utterance
+        # (its turn in the queue) until its first chunk starts playing
+        self.ttfa: Optional[float] = None
 
-                # Wait until playback is done
-                while pygame.mixer.music.get_busy():
-                    pygame.time.Clock().tick(10)
+    def cancel_renders(self):
+        for render in self.renders:
+            render.cancel()
 
-                # Cleanup
-                pygame.mixer.music.unload()
-                os.remove(tmpfile.name)
-                pygame.mixer.quit()
+    def cancel(self):
+        self.cancel_renders()
+        self.future.cancel()
+
+
+class PlaybackWorker(threading.Thread):
+    """
+    Plays queued utterances back to back on a mixer that stays open. When the
+    queue is full the oldest waiting utterance is dropped (its future cancelled)
+    rather than blocking the caller.
+    """
+
+    def __init__(self, cache=None, maxsize: int = PLAYBACK_QUEUE_SIZE):
+        super().__init__(name="tts-playback", daemon=True)
+        self.cache = cache or get_audio_cache()
+        self._queue: "queue.Queue[Optional[Utterance]]" = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        # bumped by interrupt(); an utterance from an older generation is stopped or skipped
+        self._generation = 0
+        self._mixer_ready = False
+        # single render thread: chunks are synthesized in the order they will play
+        self._render = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-render")
+        self._ttfa = deque(maxlen=100)
+        self.played = 0
+        self.interrupted = 0
+        self.dropped = 0
+
+    def submit(self, text: str, stream: Optional[bool] = None) -> Future:
+        with self._lock:
+            utt = Utterance(text, self._generation, stream)
+            utt.renders = [self._render.submit(self.cache.get, chunk) for chunk in utt.chunks]
+            while True:
+                try:
+                    self._queue.put_nowait(utt)
+                    break
+                except queue.Full:
+                    try:
+                        oldest = self._queue.get_nowait()
+                    except queue.Empty:
+                        continue
+                    if oldest is not None:
+                        oldest.cancel()
+                        self.dropped += 1
+        return utt.future
+
+    def interrupt(self):
+        """Barge-in: stop the utterance playing now and cancel everything queued."""
+        with self._lock:
+            self._generation += 1
+            while True:
+                try:
+                    utt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if utt is not None:
+                    utt.cancel()
+
+    def stats(self) -> dict:
+        ttfa = sorted(self._ttfa)
+        return {
+            "played": self.played,
+            "interrupted": self.interrupted,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+            "ttfa_ms_last": round(self._ttfa[-1] * 1000, 1) if ttfa else None,
+            "ttfa_ms_p50": round(statistics.median(ttfa) * 1000, 1) if ttfa else None,
+            "ttfa_ms_max": round(ttfa[-1] * 1000, 1) if ttfa else None,
+        }
+
+    def close(self):
+        self.interrupt()
+        self._queue.put(None)
+
+    def run(self):
+        while True:
+            utt = self._queue.get()
+            if utt is None:
+                break
+            if not utt.future.set_running_or_notify_cancel():
+                utt.cancel()
+                continue  # cancelled by the caller while queued
+            try:
+                utt.future.set_result(self._play(utt))
             except Exception as e:
                 print(f"[TTS Error] {e}")
+                utt.future.set_exception(e)
+            finally:
+                utt.cancel_renders()  # chunks not reached (barge-in, error) are not synthesized
+        self._render.shutdown(cancel_futures=True)
+        if self._mixer_ready:
+            pygame.mixer.quit()
+
+    def _stale(self, utt: Utterance) -> bool:
+        return utt.generation != self._generation
+
+    def _play(self, utt: Utterance) -> bool:
+        turn = time.perf_counter()
+        for i, render in enumerate(utt.renders):
+            if self._stale(utt):
+                self.interrupted += 1
+                return False
+            # Rendered file from the content-addressed cache (synthesized on a miss,
+            # usually while the previous chunk was playing)
+            path = render.result()
+            if self._stale(utt):
+                self.interrupted += 1
+                return False
+
+            if not self._mixer_ready:
+                pygame.mixer.init()
+                self._mixer_ready = True
+            pygame.mixer.music.load(path)
+            pygame.mixer.music.play()
+            if i == 0:
+                self._first_audio(utt, time.perf_counter() - turn)
+            try:
+                while pygame.mixer.music.get_busy():
+                    if self._stale(utt):
+                        pygame.mixer.music.stop()
+                        self.interrupted += 1
+                        return False
+                    pygame.time.wait(int(PLAYBACK_POLL_SECONDS * 1000))
+            finally:
+                # releases the file (the cache may evict it); the mixer itself stays open
+                pygame.mixer.music.unload()
+        self.played += 1
+        return True
+
+    def _first_audio(self, utt: Utterance, seconds: float):
+        utt.ttfa = seconds
+        self._ttfa.append(seconds)
+        if TTS_TIMING_LOG:
+            print(f"[TTS] first audio after {seconds * 1000:.0f} ms ({len(utt.chunks)} chunks): {utt.text[:40]!r}")
+
+
+_player: Optional[PlaybackWorker] = None
+_player_lock = threading.Lock()
+
+
+def get_player() -> PlaybackWorker:
+    global _player
+    with _player_lock:
+        if _player is None:
+            _player = PlaybackWorker()
+            _player.start()
+        return _player
+
+
+def speak(text: str, stream: Optional[bool] = None) -> Future:
+    """
+    Queue `text` for playback (works inside Docker) and return at once; the
+    returned Future completes when it has played. Wait on it with .result().
+    `stream` overrides TTS_STREAMING (sentence-by-sentence synthesis).
+    """
+    if not text or not text.strip():
+        done: Future = Future()
+        done.set_result(True)
+        return done
+    return get_player().submit(text, stream)
+
 
-    threading.Thread(target=_worker, daemon=True).start()
+def stop_speaking():
+    """Barge-in: cut off the current utterance and drop the queued ones."""
+    if _player is not None:
+        _player.interrupt()
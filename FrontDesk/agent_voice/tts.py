@@ -0,0 +1,307 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import wave
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+# Content-addressed on-disk cache of synthesized utterances. The file name is a
+# hash of (engine, lang, text), so the same phrase is synthesized once and then
+# played from disk by every process sharing TTS_CACHE_DIR. Total size is kept
+# under TTS_CACHE_MAX_MB by evicting the least recently played files.
+
+TTS_ENGINE = os.getenv("TTS_ENGINE", "gtts")  # "gtts" or "stub" (offline, for tests)
+TTS_LANG = os.getenv("TTS_LANG", "en")
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_MAX_MB = float(os.getenv("TTS_CACHE_MAX_MB", "200"))
+# KB answers rendered ahead of time: newest N at startup, then every KB write (GET /events)
+TTS_PRERENDER = os.getenv("TTS_PRERENDER", "true").lower() in ("1", "true", "yes")
+TTS_PRERENDER_BACKFILL = int(os.getenv("TTS_PRERENDER_BACKFILL", "200"))
+# streaming: synthesize and play an utterance sentence by sentence, so playback
+# starts after the first sentence instead of after the whole text
+TTS_STREAMING = os.getenv("TTS_STREAMING", "true").lower() in ("1", "true", "yes")
+TTS_CHUNK_MAX_CHARS = int(os.getenv("TTS_CHUNK_MAX_CHARS", "200"))
+
+# agent phrasing of a KB answer; callers and the prerenderer must produce the same text
+KB_ANSWER_TEMPLATE = "Here's what I found: {answer}"
+
+
+def kb_answer_text(answer: str) -> str:
+    return KB_ANSWER_TEMPLATE.format(answer=answer)
+
+
+def normalize_utterance(text: str) -> str:
+    return " ".join(text.split())
+
+
+# sentence (or clause) ends followed by whitespace; "9:30" and "3.5" stay whole
+_CHUNK_END = re.compile(r"(?<=[.!?;:])\s+")
+
+
+def split_sentences(text: str, max_chars: int = TTS_CHUNK_MAX_CHARS) -> List[str]:
+    """
+    Streaming chunks of `text`: one per sentence or clause ending in . ! ? ; :
+    with longer runs split at the last comma (else space) before `max_chars`.
+    """
+    chunks = []
+    for part in _CHUNK_END.split(normalize_utterance(text)):
+        while len(part) > max_chars:
+            cut = part.rfind(", ", 0, max_chars)
+            cut = cut + 1 if cut > 0 else part.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            chunks.append(part[:cut].strip())
+            part = part[cut:].strip()
+        if part:
+            chunks.append(part)
+    return chunks
+
+
+def utterance_chunks(text: str, stream: Optional[bool] = None) -> List[str]:
+    """The pieces `text` is synthesized (and cached) as; speech and the prerenderer must agree."""
+    if stream is None:
+        stream = TTS_STREAMING
+    if not stream:
+        text = normalize_utterance(text)
+        return [text] if text else []
+    return split_sentences(text)
+
+
+# ------------------------------
+# Engines
+# ------------------------------
+class GTTSEngine:
+    """Google TTS (network); MP3 output."""
+
+    name = "gtts"
+    ext = ".mp3"
+
+    def synthesize(self, text: str, lang: str, path: str):
+        from gtts import gTTS
+        gTTS(text=text, lang=lang).save(path)
+
+
+class StubTTSEngine:
+    """
+    Offline engine for tests and demos without network: a silent WAV whose
+    length follows the text (~60 ms per character), plus a call counter.
+    """
+
+    name = "stub"
+    ext = ".wav"
+
+    def __init__(self, ms_per_char: float = 60.0, rate: int = 8000):
+        self.ms_per_char = ms_per_char
+        self.rate = rate
+        self.calls = 0
+
+    def synthesize(self, text: str, lang: str, path: str):
+        self.calls += 1
+        frames = int(self.rate * len(text) * self.ms_per_char / 1000)
+        with wave.open(path, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(self.rate)
+            w.writeframes(b"\x00\x00" * frames)
+
+
+def create_engine(name: Optional[str] = None):
+    name = name or TTS_ENGINE
+    if name == "stub":
+        return StubTTSEngine()
+    if name == "gtts":
+        return GTTSEngine()
+    raise ValueError(f"Unknown TTS_ENGINE {name!r} (expected 'gtts' or 'stub')")
+
+
+# ------------------------------
+# Audio cache
+# ------------------------------
+class AudioCache:
+    """Size-bounded LRU of rendered utterances in `directory` (recency = file mtime)."""
+
+    def __init__(self, engine, directory: str = TTS_CACHE_DIR, max_bytes: int = int(TTS_CACHE_MAX_MB * 1024 * 1024)):
+        self.engine = engine
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._rendering: Dict[str, threading.Event] = {}
+        os.makedirs(directory, exist_ok=True)
+        # path -> (size, last use); rebuilt from disk so restarts keep the cache
+        self._entries: Dict[str, Tuple[int, float]] = {}
+        for name in os.listdir(directory):
+            st = os.stat(os.path.join(directory, name))
+            if name.endswith(".tmp"):
+                # left by a crashed render (a live one is never this old)
+                if st.st_mtime < time.time() - 3600:
+                    os.remove(os.path.join(directory, name))
+                continue
+            self._entries[name] = (st.st_size, st.st_mtime)
+        self._size = sum(size for size, _ in self._entries.values())
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text: str, lang: str) -> str:
+        digest = hashlib.sha256(f"{self.engine.name}\0{lang}\0{normalize_utterance(text)}".encode("utf-8")).hexdigest()
+        return digest + self.engine.ext
+
+    def cached(self, text: str, lang: str = TTS_LANG) -> Optional[str]:
+        """Path of the rendered utterance if present (marks it recently used), else None."""
+        name = self.key(text, lang)
+        path = os.path.join(self.directory, name)
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            # never rendered, or evicted (possibly by another process sharing the directory)
+            with self._lock:
+                self._forget(name)
+            return None
+        with self._lock:
+            if name in self._entries:
+                self._entries[name] = (self._entries[name][0], now)
+            else:
+                # rendered by another process sharing the directory
+                size = os.path.getsize(path)
+                self._entries[name] = (size, now)
+                self._size += size
+        return path
+
+    def get(self, text: str, lang: str = TTS_LANG) -> str:
+        """Path of the rendered utterance, synthesizing it on a miss (one render per text at a time)."""
+        name = self.key(text, lang)
+        while True:
+            path = self.cached(text, lang)
+            with self._lock:
+                if path:
+                    self.hits += 1
+                    return path
+                pending = self._rendering.get(name)
+                if pending is None:
+                    self._rendering[name] = threading.Event()
+                    self.misses += 1
+                    break
+            pending.wait()  # another thread is rendering the same text
+
+        try:
+            path = os.path.join(self.directory, name)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            self.engine.synthesize(normalize_utterance(text), lang, tmp)
+            os.replace(tmp, path)  # readers never see a partial file
+            size = os.path.getsize(path)
+            with self._lock:
+                self._forget(name)
+                self._entries[name] = (size, time.time())
+                self._size += size
+                self._evict()
+            return path
+        finally:
+            with self._lock:
+                self._rendering.pop(name).set()
+
+    def _forget(self, name: str):
+        old = self._entries.pop(name, None)
+        if old:
+            self._size -= old[0]
+
+    def _evict(self):
+        if self._size <= self.max_bytes:
+            return
+        for name, _ in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self._size <= self.max_bytes or len(self._entries) == 1:
+                break
+            self._forget(name)
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+
+_cache: Optional[AudioCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_audio_cache() -> AudioCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AudioCache(create_engine())
+        return _cache
+
+
+# ------------------------------
+# Background prerendering of KB answers
+# ------------------------------
+class KBPrerenderer(threading.Thread):
+    """
+    Renders the agent's KB-answer utterances ahead of time: the newest
+    TTS_PRERENDER_BACKFILL answers at start, then each kb.updated event from
+    the backend's /events stream, so a confident answer plays from disk.
+    """
+
+    def __init__(self, backend_url: str, cache: AudioCache, phrases: Iterable[str] = (),
+                 on_error: Callable[[Exception], None] = lambda e: print(f"[TTS prerender] {e}")):
+        super().__init__(name="tts-prerender", daemon=True)
+        self.backend_url = backend_url.rstrip("/")
+        self.cache = cache
+        self.phrases = list(phrases)
+        self.on_error = on_error
+        self.rendered = 0
+        self._last_event_id: Optional[str] = None
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def render(self, text: str):
+        for chunk in utterance_chunks(text):
+            if self.cache.cached(chunk):
+                continue
+            try:
+                self.cache.get(chunk)
+                self.rendered += 1
+            except Exception as e:
+                self.on_error(e)
+
+    def backfill(self):
+        for phrase in self.phrases:
+            self.render(phrase)
+        if TTS_PRERENDER_BACKFILL <= 0:
+            return
+        r = requests.get(f"{self.backend_url}/learned-answers", timeout=8,
+                         params={"limit": TTS_PRERENDER_BACKFILL, "order": "desc", "fields": "id,answer"})
+        r.raise_for_status()
+        for row in r.json():
+            self.render(kb_answer_text(row["answer"]))
+
+    def follow_events(self):
+        headers = {"Last-Event-ID": self._last_event_id} if self._last_event_id else {}
+        with requests.get(f"{self.backend_url}/events", headers=headers, stream=True, timeout=(5, 60)) as resp:
+            resp.raise_for_status()
+            kind = None
+            for line in resp.iter_lines(decode_unicode=True):
+                if self._stop.is_set():
+                    return
+                if line.startswith("id:"):
+                    self._last_event_id = line[3:].strip()
+                elif line.startswith("event:"):
+                    kind = line[6:].strip()
+                elif line.startswith("data:") and kind == "kb.updated":
+                    row = json.loads(line[5:]).get("row") or {}
+                    self.render(kb_answer_text(row.get("answer", "")))
+
+    def run(self):
+        try:
+            self.backfill()
+        except Exception as e:
+            self.on_error(e)
+        while not self._stop.is_set():
+            try:
+                self.follow_events()
+            except Exception as e:
+                self.on_error(e)
+                self._stop.wait(5)
@@ -14,19 +14,120 @@
 
 # backend/db.py
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./frontdesk.db")
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {})
+
+# -------------------------
+# SQLite engine profile (env overridable; an empty value skips that pragma)
+# -------------------------
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),      # readers never block the writer
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),     # fsync at checkpoints only (safe with WAL)
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"),  # wait for the write lock instead of failing
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-20000"),       # negative = KiB
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+
+def _async_url(url: str) -> str:
+    """Async driver URL for a sync DATABASE_URL (sqlite -> aiosqlite, postgresql -> asyncpg)."""
+    scheme, sep, rest = url.partition("://")
+    driver = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "postgresql+psycopg2": "postgresql+asyncpg"}
+    return driver.get(scheme, scheme) + sep + rest
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_url(DATABASE_URL))
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url.split("://")[-1] in ("", "/:memory:") or "mode=memory" in url
+
+
+def _install_sqlite_hooks(sync_engine, pragmas: dict):
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_conn, _record):
+        # hand transaction control to SQLAlchemy (the "begin" hook below emits BEGIN)
+        dbapi_conn.isolation_level = None
+        cursor = dbapi_conn.cursor()
+        for name, value in pragmas.items():
+            if value not in (None, ""):
+                cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    @event.listens_for(sync_engine, "begin")
+    def _on_begin(conn):
+        conn.exec_driver_sql("BEGIN " + conn.get_execution_options().get("sqlite_begin", "DEFERRED"))
+
+
+def _pool_kwargs(url: str, engine_kwargs: dict) -> dict:
+    if not (url.startswith("sqlite") and _is_memory_sqlite(url)):
+        engine_kwargs.setdefault("pool_size", DB_POOL_SIZE)
+        engine_kwargs.setdefault("max_overflow", DB_MAX_OVERFLOW)
+        engine_kwargs.setdefault("pool_timeout", DB_POOL_TIMEOUT)
+    return engine_kwargs
+
+
+def create_db_engine(url: str = DATABASE_URL, pragmas: dict = None, **engine_kwargs):
+    """
+    Engine for `url`. For SQLite: pragmas on every new connection, a sized
+    connection pool, and explicit BEGIN statements so write sessions can take
+    the write lock up front (BEGIN IMMEDIATE, see get_session(write=True)).
+    A deferred transaction that reads first and writes later fails with
+    "database is locked" when another writer committed in between;
+    busy_timeout cannot help that case, an immediate transaction avoids it.
+    """
+    engine_kwargs = _pool_kwargs(url, engine_kwargs)
+    if not url.startswith("sqlite"):
+        return create_engine(url, **engine_kwargs)
+    eng = create_engine(url, connect_args={"check_same_thread": False}, **engine_kwargs)
+    _install_sqlite_hooks(eng, SQLITE_PRAGMAS if pragmas is None else pragmas)
+    return eng
+
+
+def create_async_db_engine(url: str = ASYNC_DATABASE_URL, pragmas: dict = None, **engine_kwargs):
+    """Async counterpart of create_db_engine (same profile, aiosqlite driver for SQLite)."""
+    eng = create_async_engine(url, **_pool_kwargs(url, engine_kwargs))
+    if url.startswith("sqlite"):
+        _install_sqlite_hooks(eng.sync_engine, SQLITE_PRAGMAS if pragmas is None else pragmas)
+    return eng
+
+
+# Sync engine: startup, migrations, KB index rebuilds and the background jobs
+engine = create_db_engine()
+# same pool; sessions bound here start with BEGIN IMMEDIATE on SQLite
+write_engine = engine.execution_options(sqlite_begin="IMMEDIATE")
+# Async engine: API request handlers
+async_engine = create_async_db_engine()
+async_write_engine = async_engine.execution_options(sqlite_begin="IMMEDIATE")
 
 def init_db():
-    # create database tables
+    # create database tables, then bring existing ones up to date
+    from backend.migrations import run_migrations
     SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
 
-def get_session():
-    return Session(engine)
+def get_session(write: bool = False):
+    """New (sync) session; write=True for units of work that read and then write."""
+    return Session(write_engine if write else engine)
 
+# -------------------------
+# FastAPI dependencies: one async session per request, shared by everything the request does
+# (expire_on_commit=False: attributes stay readable after commit without another round trip)
+# -------------------------
+async def get_db():
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
 
+async def get_write_db():
+    async with AsyncSession(async_write_engine, expire_on_commit=False) as session:
+        yield session
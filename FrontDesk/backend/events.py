@@ -0,0 +1,186 @@
+# backend/events.py
+import asyncio
+import json
+import os
+from typing import List, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session as ORMSession
+
+from backend.models import HelpRequest, KnowledgeBase
+from backend.pagination import row_dict
+
+# Push notifications for supervisors (GET /events, Server-Sent Events).
+# Events are collected while a session flushes and published only after its
+# transaction commits, so a client never hears about a row it cannot read yet.
+# Every event carries the change_seq of the change it reports (the SSE id), so
+# a client that falls behind can catch up from GET /changes?since=<last id>.
+#
+# Fan-out: each connected client has its own bounded queue. Frames are
+# serialized once per event, not once per client; a client that stops reading
+# loses its oldest frames (never blocking the publisher or other clients) and
+# is sent a "resync" event telling it where to catch up from.
+
+# frames buffered per client before the oldest are dropped
+EVENTS_BUFFER_SIZE = int(os.getenv("EVENTS_BUFFER_SIZE", "256"))
+# concurrent /events clients (503 beyond this)
+EVENTS_MAX_CLIENTS = int(os.getenv("EVENTS_MAX_CLIENTS", "1000"))
+# seconds between keepalive comments on an idle stream
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+# seconds before a stream is closed for the client to reconnect with Last-Event-ID
+# (bounds how long an open stream can hold up a graceful server shutdown)
+EVENTS_MAX_AGE = float(os.getenv("EVENTS_MAX_AGE", "300"))
+# client reconnect delay sent in the stream (ms)
+EVENTS_RETRY_MS = 1000
+
+PENDING_KEY = "pending_events"
+TABLE_PREFIX = {"helprequest": "request", "knowledgebase": "kb"}
+
+
+def sse_frame(kind: str, data: dict, event_id: Optional[int] = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {kind}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscriber:
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.lagged = False
+
+
+class EventBus:
+    """In-process fan-out of committed changes to /events subscribers."""
+
+    def __init__(self, buffer_size: int = EVENTS_BUFFER_SIZE, max_clients: int = EVENTS_MAX_CLIENTS):
+        self.buffer_size = buffer_size
+        self.max_clients = max_clients
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers = set()
+        self.published = 0
+        self.dropped = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Deliver on `loop` (the server's event loop); publishing before this is a no-op."""
+        self._loop = loop
+
+    def subscribe(self) -> Optional[Subscriber]:
+        if len(self._subscribers) >= self.max_clients:
+            return None
+        sub = Subscriber(self.buffer_size)
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self._subscribers.discard(sub)
+
+    def publish(self, events: List[dict]):
+        """Thread-safe: called from the loop (async sessions) and from worker threads alike."""
+        if not events or self._loop is None:
+            return
+        frames = [(e["change_seq"], sse_frame(e["type"], e, e["change_seq"])) for e in events]
+        try:
+            self._loop.call_soon_threadsafe(self._deliver, frames)
+        except RuntimeError:
+            pass  # loop already closed (shutdown)
+
+    def _deliver(self, frames):
+        self.published += len(frames)
+        for sub in self._subscribers:
+            for frame in frames:
+                if sub.queue.full():
+                    sub.queue.get_nowait()
+                    sub.dropped += 1
+                    sub.lagged = True
+                    self.dropped += 1
+                sub.queue.put_nowait(frame)
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._subscribers),
+            "published": self.published,
+            "dropped": self.dropped,
+            "buffer_size": self.buffer_size,
+        }
+
+
+bus = EventBus()
+
+
+async def event_stream(sub: Subscriber, cursor: int, since: Optional[int], heartbeat: float = EVENTS_HEARTBEAT,
+                       max_age: float = EVENTS_MAX_AGE):
+    """
+    SSE body for one subscriber. `cursor` is the change_seq committed when the
+    client subscribed; events at or below it are already visible to a fresh read.
+    """
+    last_seq = cursor
+    loop = asyncio.get_running_loop()
+    closes_at = loop.time() + max_age
+    try:
+        yield f"retry: {EVENTS_RETRY_MS}\n" + sse_frame("hello", {"cursor": cursor}, cursor)
+        if since is not None and since < cursor:
+            yield sse_frame("resync", {"since": since, "cursor": cursor})
+        while True:
+            remaining = closes_at - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                seq, frame = await asyncio.wait_for(sub.queue.get(), min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if sub.lagged:
+                sub.lagged = False
+                yield sse_frame("resync", {"since": last_seq, "dropped": sub.dropped})
+            if seq <= cursor:
+                continue
+            last_seq = seq
+            yield frame
+    finally:
+        bus.unsubscribe(sub)
+
+
+# -------------------------
+# Session hooks: collect on flush, publish on commit
+# -------------------------
+def queue_event(session, kind: str, change_seq: int, **data):
+    session.info.setdefault(PENDING_KEY, []).append({"type": kind, "change_seq": change_seq, **data})
+
+
+def queue_deletions(session, table_name: str, seqs_and_ids):
+    prefix = TABLE_PREFIX.get(table_name, table_name)
+    for seq, row_id in seqs_and_ids:
+        queue_event(session, f"{prefix}.deleted", seq, table=table_name, id=row_id)
+
+
+_HELPREQUEST_FIELDS = list(HelpRequest.__table__.columns.keys())
+# normalized_pattern is internal (see LEARNED_ANSWER_FIELDS in main.py)
+_KB_FIELDS = [c for c in KnowledgeBase.__table__.columns.keys() if c != "normalized_pattern"]
+
+
+@event.listens_for(ORMSession, "after_flush")
+def _collect_events(session, flush_context):
+    # ids and change_seq (assigned in versioning's before_flush) are set by now;
+    # attribute history still shows what this flush changed
+    for obj in session.new:
+        if isinstance(obj, HelpRequest):
+            queue_event(session, "request.created", obj.change_seq, id=obj.id, row=row_dict(obj, _HELPREQUEST_FIELDS))
+        elif isinstance(obj, KnowledgeBase):
+            queue_event(session, "kb.updated", obj.change_seq, id=obj.id, row=row_dict(obj, _KB_FIELDS))
+    for obj in session.dirty:
+        if isinstance(obj, HelpRequest) and session.is_modified(obj):
+            resolved = inspect(obj).attrs.status.history.added and obj.status != "pending"
+            kind = "request.resolved" if resolved else "request.updated"
+            queue_event(session, kind, obj.change_seq, id=obj.id, row=row_dict(obj, _HELPREQUEST_FIELDS))
+        elif isinstance(obj, KnowledgeBase) and session.is_modified(obj):
+            queue_event(session, "kb.updated", obj.change_seq, id=obj.id, row=row_dict(obj, _KB_FIELDS))
+
+
+@event.listens_for(ORMSession, "after_commit")
+def _publish_events(session):
+    bus.publish(session.info.pop(PENDING_KEY, None))
+
+
+@event.listens_for(ORMSession, "after_rollback")
+def _discard_events(session):
+    session.info.pop(PENDING_KEY, None)
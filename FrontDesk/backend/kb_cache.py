@@ -0,0 +1,78 @@
+# backend/kb_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from backend.kb_index import normalize_text
+
+
+class KBQueryCache:
+    """
+    Bounded LRU + TTL cache for KB search results.
+    Keys are (normalized query, top_k, cutoff); every entry remembers the KB
+    version it was computed at, so results from before a KB write are never served.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Tuple, Tuple[int, float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(query: str, top_k: int, cutoff: float) -> Tuple:
+        return (normalize_text(query), top_k, round(cutoff, 6))
+
+    def get(self, query: str, top_k: int, cutoff: float, version: int) -> Optional[Any]:
+        if self.max_entries <= 0:
+            return None
+        key = self.key(query, top_k, cutoff)
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            item_version, expires_at, value = item
+            if item_version != version or expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, query: str, top_k: int, cutoff: float, version: int, value: Any):
+        if self.max_entries <= 0:
+            return
+        key = self.key(query, top_k, cutoff)
+        with self._lock:
+            self._data[key] = (version, time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Drop every cached result (called whenever the KB changes)."""
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
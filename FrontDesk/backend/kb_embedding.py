@@ -0,0 +1,221 @@
+# backend/kb_embedding.py
+import os
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlmodel import select, delete, insert
+
+from backend.kb_index import KBIndex, KBEntry, normalize_text, char_ngrams
+from backend.models import KBEmbedding
+
+
+# ------------------------------
+# Embedders (CPU only, no network)
+# ------------------------------
+class SentenceTransformerEmbedder:
+    """
+    Sentence-transformers model loaded from local files only (a model directory or
+    the local HF cache), so neither startup nor queries ever touch the network.
+    """
+
+    def __init__(self, model_name: str):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError("KB_EMBED_MODEL requires the sentence-transformers package") from e
+        self.name = model_name
+        self._model = SentenceTransformer(model_name, device="cpu", local_files_only=True)
+        self.dim = self._model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = self._model.encode(texts, convert_to_numpy=True, normalize_embeddings=True, batch_size=64)
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+class HashingEmbedder:
+    """
+    Dependency-free feature-hashing embedder (words + char trigrams). Lexical
+    only — it does not catch paraphrases — but handy for tests and small installs.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.name = f"hashing-{dim}"
+        self.dim = dim
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            normalized = normalize_text(text)
+            for feature in normalized.split() + sorted(char_ngrams(normalized)):
+                h = zlib.crc32(feature.encode("utf-8"))
+                out[i, h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+def create_embedder(model: Optional[str] = None):
+    """
+    KB_EMBED_MODEL: "hashing" (default, no extra packages) or, opt-in, a local
+    sentence-transformers model name/path such as "all-MiniLM-L6-v2".
+    """
+    model = model or os.getenv("KB_EMBED_MODEL", "hashing")
+    if model == "hashing":
+        return HashingEmbedder()
+    return SentenceTransformerEmbedder(model)
+
+
+# ------------------------------
+# Embedding KB index
+# ------------------------------
+class EmbeddingKBIndex(KBIndex):
+    """
+    Semantic KB index: one embedding per entry kept in a contiguous float32
+    matrix; queries are scored with a single matrix-vector (or matrix-matrix
+    for batches) dot product. Scores are cosine similarities.
+
+    Entry vectors are computed at write time (upsert/rebuild) and persisted in
+    the KBEmbedding table, so restarts only embed entries that have no vector yet.
+    """
+
+    def __init__(self, embedder, session_factory: Optional[Callable] = None, prune_orphans: bool = True):
+        super().__init__()
+        self.embedder = embedder
+        self.session_factory = session_factory
+        self.prune_orphans = prune_orphans
+        self._rows: List[KBEntry] = []
+        self._row_of: Dict[str, int] = {}
+        self._matrix = np.zeros((0, embedder.dim), dtype=np.float32)
+        self._pending_vector = None
+
+    # -- persistence -------------------------------------------------
+    def _load_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        if self.session_factory is None:
+            return {}
+        with self.session_factory() as session:
+            rows = session.exec(select(KBEmbedding).where(KBEmbedding.model == self.embedder.name)).all()
+            wanted = set(ids)
+            orphans = [r.kb_id for r in rows if r.kb_id not in wanted]
+            if orphans and self.prune_orphans:
+                session.exec(delete(KBEmbedding).where(KBEmbedding.kb_id.in_(orphans)))
+                session.commit()
+            return {
+                r.kb_id: np.frombuffer(r.vector, dtype=np.float32)
+                for r in rows if r.kb_id in wanted and r.dim == self.embedder.dim
+            }
+
+    def _save_vectors(self, ids: List[str], vectors: np.ndarray):
+        if self.session_factory is None or not ids:
+            return
+        rows = [
+            {"kb_id": kb_id, "model": self.embedder.name, "dim": self.embedder.dim, "vector": vec.tobytes()}
+            for kb_id, vec in zip(ids, vectors)
+        ]
+        # delete + bulk insert (portable upsert) keeps the write transaction short
+        with self.session_factory() as session:
+            for start in range(0, len(ids), 500):
+                session.exec(delete(KBEmbedding).where(KBEmbedding.kb_id.in_(ids[start:start + 500])))
+            session.exec(insert(KBEmbedding), params=rows)
+            session.commit()
+
+    # -- snapshots ---------------------------------------------------
+    @property
+    def signature(self) -> str:
+        return f"{type(self).__name__}:{self.embedder.name}:{self.embedder.dim}"
+
+    def export_state(self):
+        with self._lock:
+            n = len(self._rows)
+            payload = {"entries": list(self._rows), "version": self._version, "watermark": self._applied_seq}
+            # a copy: the slice is a view that a later _remove/upsert may overwrite while it is being saved
+            return payload, {"vectors": self._matrix[:n].copy()}
+
+    def import_state(self, payload: dict, arrays: dict):
+        rows = payload["entries"]
+        with self._lock:
+            self._rows = list(rows)
+            self._row_of = {e.id: i for i, e in enumerate(rows)}
+            # may be a read-only memory map; copied on the first write (see _writable)
+            self._matrix = arrays["vectors"]
+            self._installed({e.id: e for e in rows})
+            self._version = payload["version"]
+
+    def _writable(self):
+        if not self._matrix.flags.writeable:
+            self._matrix = np.array(self._matrix, dtype=np.float32)
+
+    # -- index maintenance -------------------------------------------
+    def rebuild(self, entries: Iterable[KBEntry]):
+        rows = list(entries)
+        stored = self._load_vectors([e.id for e in rows])
+        missing = [e for e in rows if e.id not in stored]
+        if missing:
+            fresh = self.embedder.encode([e.question_pattern for e in missing])
+            self._save_vectors([e.id for e in missing], fresh)
+            stored.update(zip((e.id for e in missing), fresh))
+
+        matrix = np.empty((max(len(rows), 16), self.embedder.dim), dtype=np.float32)
+        for i, entry in enumerate(rows):
+            matrix[i] = stored[entry.id]
+        with self._lock:
+            self._rows = rows
+            self._row_of = {e.id: i for i, e in enumerate(rows)}
+            self._matrix = matrix
+            self._installed({e.id: e for e in rows})
+
+    def upsert(self, entry: KBEntry):
+        # embed and persist outside the lock; only the matrix write is serialized
+        vector = self.embedder.encode([entry.question_pattern])[0]
+        self._save_vectors([entry.id], vector.reshape(1, -1))
+        with self._lock:
+            self._pending_vector = vector
+            super().upsert(entry)
+
+    def _add(self, entry: KBEntry):
+        n = len(self._rows)
+        if n == self._matrix.shape[0]:
+            grown = np.empty((max(16, n * 2), self.embedder.dim), dtype=np.float32)
+            grown[:n] = self._matrix[:n]
+            self._matrix = grown
+        else:
+            self._writable()
+        self._matrix[n] = self._pending_vector
+        self._rows.append(entry)
+        self._row_of[entry.id] = n
+
+    def _remove(self, entry_id: str):
+        # swap-remove keeps the live rows contiguous in matrix[:len(rows)]
+        row = self._row_of.pop(entry_id)
+        last = len(self._rows) - 1
+        if row != last:
+            self._writable()
+            moved = self._rows[last]
+            self._matrix[row] = self._matrix[last]
+            self._rows[row] = moved
+            self._row_of[moved.id] = row
+        self._rows.pop()
+
+    # -- search ------------------------------------------------------
+    def _top(self, scores: np.ndarray, rows: List[KBEntry], top_k: int, cutoff: float) -> List[Tuple[KBEntry, float]]:
+        hits = np.flatnonzero(scores >= cutoff)
+        if hits.size > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(rows[i], float(scores[i])) for i in hits]
+
+    def search(self, query: str, top_k: int = 3, cutoff: float = 0.45) -> List[Tuple[KBEntry, float]]:
+        return self.search_many([query], top_k=top_k, cutoff=cutoff)[0]
+
+    def search_many(self, queries: List[str], top_k: int = 3, cutoff: float = 0.45) -> List[List[Tuple[KBEntry, float]]]:
+        results: List[List[Tuple[KBEntry, float]]] = [[] for _ in queries]
+        asked = [i for i, q in enumerate(queries) if normalize_text(q)]
+        if top_k <= 0 or not asked:
+            return results
+        query_vectors = self.embedder.encode([queries[i] for i in asked])
+        with self._lock:
+            rows = list(self._rows)
+            scores = self._matrix[:len(rows)].dot(query_vectors.T)  # N x len(asked)
+        for j, i in enumerate(asked):
+            results[i] = self._top(scores[:, j], rows, top_k, cutoff)
+        return results
@@ -0,0 +1,368 @@
+# backend/kb_index.py
+import difflib
+import heapq
+import itertools
+import os
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_WS_RE = re.compile(r"\s+")
+_WORD_RE = re.compile(r"\w+")
+
+# Words ignored by the keyword relevance gate
+STOPWORDS = frozenset({"the", "is", "and", "a", "an", "to", "for", "in", "of", "on", "are", "you", "we", "do", "have"})
+
+
+def normalize_text(text: str) -> str:
+    """Lower-case and collapse whitespace so equivalent questions index identically."""
+    return _WS_RE.sub(" ", (text or "").lower()).strip()
+
+
+def keyword_set(text: str) -> frozenset:
+    """Lower-cased word tokens minus stopwords, used by the relevance gate."""
+    return frozenset(_WORD_RE.findall((text or "").lower())) - STOPWORDS
+
+
+def is_relevant(query_keywords: frozenset, entry: "KBEntry", min_overlap: int = 2) -> bool:
+    """Simple relevance check: at least `min_overlap` common keywords."""
+    return len(query_keywords & entry.keywords) >= min_overlap
+
+
+def similarity(a: str, b: str) -> float:
+    """difflib ratio of two normalized strings."""
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def same_question(normalized: str, keywords: frozenset, entry: "KBEntry", threshold: float) -> bool:
+    """
+    Near-duplicate test used before merging learned answers: the normalized
+    patterns must be close (difflib ratio >= threshold) AND use the same
+    keywords. Similar wording alone is not enough: "hours on sunday" and
+    "hours on monday" score 0.93 but ask different questions.
+    """
+    if normalized == entry.normalized:
+        return True
+    return keywords == entry.keywords and similarity(normalized, entry.normalized) >= threshold
+
+
+def char_ngram_list(text: str, n: int = 3) -> List[str]:
+    """Character n-grams of an already-normalized string (padded so short strings still produce grams)."""
+    padded = f" {text} "
+    if len(padded) <= n:
+        return [padded]
+    return [padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+
+def char_ngrams(text: str, n: int = 3) -> Set[str]:
+    return set(char_ngram_list(text, n))
+
+
+# ------------------------------
+# Index entry
+# ------------------------------
+@dataclass
+class KBEntry:
+    id: str
+    question_pattern: str
+    answer: str
+    source: Optional[str] = None
+    created_at: Optional[datetime] = None
+    change_seq: Optional[int] = None
+    normalized: str = field(init=False)
+    keywords: frozenset = field(init=False)
+
+    def __post_init__(self):
+        # precomputed once per entry so searches never re-tokenize KB patterns
+        self.normalized = normalize_text(self.question_pattern)
+        self.keywords = keyword_set(self.question_pattern)
+
+    @classmethod
+    def from_row(cls, row) -> "KBEntry":
+        return cls(
+            id=row.id,
+            question_pattern=row.question_pattern,
+            answer=row.answer,
+            source=row.source,
+            created_at=row.created_at,
+            change_seq=row.change_seq,
+        )
+
+
+# ------------------------------
+# Resident KB index
+# ------------------------------
+class KBIndex:
+    """
+    In-memory view of the KnowledgeBase used by find_kb_matches.
+    Subclasses provide the scoring engine; see create_kb_index().
+
+    Writes are applied in place with upsert()/remove() so supervisors teaching
+    the system never force a full reindex. Every change bumps `version`;
+    `applied_seq` is the highest KnowledgeBase.change_seq the index has applied.
+    """
+
+    # Default score cutoffs on this engine's score scale (the defaults below are
+    # difflib ratios): "search" for find_kb_matches, "suggest" / "answer" for
+    # POST /help-requests (kb_search_cutoff / kb_cutoff), "agent" for POST /agent/ask.
+    default_cutoffs = {"search": 0.45, "suggest": 0.35, "answer": 0.55, "agent": 0.75}
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries: Dict[str, KBEntry] = {}
+        self._stale = True
+        self._version = 0
+        self._applied_seq = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, entry_id):
+        return entry_id in self._entries
+
+    @property
+    def stale(self) -> bool:
+        return self._stale
+
+    @property
+    def version(self) -> int:
+        """Monotonically increasing KB version; bumped by every rebuild/upsert/remove."""
+        return self._version
+
+    @property
+    def applied_seq(self) -> int:
+        return self._applied_seq
+
+    def _applied(self, entry: KBEntry):
+        # called under self._lock for every entry put into the index
+        if entry.change_seq is not None and entry.change_seq > self._applied_seq:
+            self._applied_seq = entry.change_seq
+
+    def get(self, entry_id: str) -> Optional[KBEntry]:
+        return self._entries.get(entry_id)
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self._entries)
+
+    @property
+    def signature(self) -> str:
+        """Identifies the engine + settings a snapshot was taken with."""
+        return type(self).__name__
+
+    def invalidate(self):
+        """Mark the index out of date; the next search reloads it from the DB."""
+        self._stale = True
+
+    def close(self):
+        """Release engine resources (worker processes etc.)."""
+
+    def _installed(self, entries_by_id: Dict[str, KBEntry]):
+        # called by engines, under self._lock, once their new structures are swapped in
+        self._entries = entries_by_id
+        self._applied_seq = max((e.change_seq or 0 for e in entries_by_id.values()), default=0)
+        self._version += 1
+        self._stale = False
+
+    def rebuild(self, entries: Iterable[KBEntry]):
+        raise NotImplementedError
+
+    def export_state(self) -> Tuple[dict, dict]:
+        """
+        (payload, arrays) for an on-disk snapshot: `payload` is pickled, `arrays`
+        are numpy arrays saved as .npy so they can be memory-mapped on load.
+        payload["watermark"] is applied_seq, read under the same lock as the entries.
+        """
+        with self._lock:
+            return {"entries": list(self._entries.values()), "version": self._version,
+                    "watermark": self._applied_seq}, {}
+
+    def import_state(self, payload: dict, arrays: dict):
+        """Install a snapshot produced by export_state() of the same engine."""
+        with self._lock:
+            self.rebuild(payload["entries"])
+            self._version = payload["version"]
+
+    def upsert(self, entry: KBEntry):
+        """Add a new entry or replace the one with the same id."""
+        with self._lock:
+            if entry.id in self._entries:
+                self._remove(entry.id)
+            self._add(entry)
+            self._entries[entry.id] = entry
+            self._applied(entry)
+            self._version += 1
+
+    def remove(self, entry_id: str) -> bool:
+        with self._lock:
+            if entry_id not in self._entries:
+                return False
+            self._remove(entry_id)
+            del self._entries[entry_id]
+            self._version += 1
+            return True
+
+    def _add(self, entry: KBEntry):
+        raise NotImplementedError
+
+    def _remove(self, entry_id: str):
+        raise NotImplementedError
+
+    def search(self, query: str, top_k: int = 3, cutoff: float = 0.45) -> List[Tuple[KBEntry, float]]:
+        """Return up to top_k (entry, score) pairs with score >= cutoff, best first."""
+        raise NotImplementedError
+
+    def find_duplicate(self, question_pattern: str, threshold: float = 0.92) -> Optional[KBEntry]:
+        """
+        Most similar existing entry that asks the same question (see
+        same_question), or None. The engine only proposes candidates, so the
+        answer does not depend on which scorer is configured.
+        """
+        normalized = normalize_text(question_pattern)
+        keywords = keyword_set(question_pattern)
+        best, best_score = None, threshold
+        for entry, _ in self.search(question_pattern, top_k=5, cutoff=0.0):
+            if not same_question(normalized, keywords, entry, threshold):
+                continue
+            score = similarity(normalized, entry.normalized)
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def search_many(self, queries: List[str], top_k: int = 3, cutoff: float = 0.45) -> List[List[Tuple[KBEntry, float]]]:
+        """search() for each query, in order. Engines override this to score queries together."""
+        return [self.search(q, top_k=top_k, cutoff=cutoff) for q in queries]
+
+
+class DifflibKBIndex(KBIndex):
+    """
+    Candidates are pruned through a character n-gram inverted index and only the
+    survivors are scored with difflib, so a query no longer touches every row.
+
+    Posting lists are walked rarest gram first and only until `max_pool` ids
+    have been collected; the remaining (common) grams just count hits for ids
+    already in the pool. Grams like "wha" or "you" occur in most patterns, so
+    walking their full lists would make every query O(N) again.
+    """
+
+    def __init__(self, n: int = 3, max_candidates: int = 200, max_pool: int = 2000):
+        super().__init__()
+        self.n = n
+        self.max_candidates = max_candidates
+        self.max_pool = max_pool
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+
+    @property
+    def signature(self) -> str:
+        return f"{type(self).__name__}:n={self.n}"
+
+    def rebuild(self, entries: Iterable[KBEntry]):
+        entries_by_id: Dict[str, KBEntry] = {}
+        postings: Dict[str, Set[str]] = defaultdict(set)
+        for entry in entries:
+            entries_by_id[entry.id] = entry
+            for gram in char_ngrams(entry.normalized, self.n):
+                postings[gram].add(entry.id)
+        with self._lock:
+            self._postings = postings
+            self._installed(entries_by_id)
+
+    def _add(self, entry: KBEntry):
+        for gram in char_ngrams(entry.normalized, self.n):
+            self._postings[gram].add(entry.id)
+
+    def _remove(self, entry_id: str):
+        old = self._entries[entry_id]
+        for gram in char_ngrams(old.normalized, self.n):
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._postings[gram]
+
+    def _candidates(self, grams: Set[str]) -> List[str]:
+        hits: Dict[str, int] = defaultdict(int)
+        postings = sorted((self._postings[g] for g in grams if g in self._postings), key=len)
+        for ids in postings:
+            room = self.max_pool - len(hits)
+            if len(ids) <= room:
+                for entry_id in ids:
+                    hits[entry_id] += 1
+            elif not hits:
+                # only common grams in the query: seed the pool from the rarest one
+                for entry_id in itertools.islice(ids, self.max_pool):
+                    hits[entry_id] += 1
+            else:
+                # too common to walk: count it for the ids already collected
+                for entry_id in hits:
+                    if entry_id in ids:
+                        hits[entry_id] += 1
+        if len(hits) <= self.max_candidates:
+            return list(hits)
+        return heapq.nlargest(self.max_candidates, hits, key=hits.__getitem__)
+
+    def search(self, query: str, top_k: int = 3, cutoff: float = 0.45) -> List[Tuple[KBEntry, float]]:
+        """
+        Scores are difflib ratios of the raw query and pattern, exactly as
+        difflib.get_close_matches computed them before the index existed (the
+        normalized text only picks candidates), so cutoffs keep their meaning.
+        Mirrors get_close_matches: cheap upper bounds are checked before ratio().
+        """
+        q = normalize_text(query)
+        if not q or top_k <= 0:
+            return []
+
+        with self._lock:
+            candidate_ids = self._candidates(char_ngrams(q, self.n))
+            candidates = [self._entries[i] for i in candidate_ids]
+
+        qlen = len(query)
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(query)
+        scored = []
+        for entry in candidates:
+            pattern = entry.question_pattern
+            plen = len(pattern)
+            # ratio() can never exceed 2*min/(sum); skip lengths that cannot reach the cutoff
+            if 2.0 * min(qlen, plen) / (qlen + plen) < cutoff:
+                continue
+            matcher.set_seq1(pattern)
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                score = matcher.ratio()
+                if score >= cutoff:
+                    scored.append((score, entry.id, entry))
+
+        best = heapq.nlargest(top_k, scored, key=lambda s: (s[0], s[1]))
+        # reported as SequenceMatcher(None, query, pattern).ratio(), the argument order the
+        # old scan used (ratio() is not always symmetric)
+        results = [(entry, difflib.SequenceMatcher(None, query, entry.question_pattern).ratio()) for _, _, entry in best]
+        results.sort(key=lambda r: r[1], reverse=True)
+        return results
+
+
+def create_kb_index(matcher: Optional[str] = None, session_factory=None, shards: Optional[int] = None) -> KBIndex:
+    """
+    Build the KB index engine named by `matcher` (or the KB_MATCHER env var):
+    "difflib" (default), "tfidf" (needs numpy + scipy) or "embedding" (needs numpy;
+    vectors are persisted through `session_factory` when given).
+    `shards` (or KB_SHARDS) > 1 partitions the KB across that many worker processes.
+    """
+    matcher = (matcher or os.getenv("KB_MATCHER", "difflib")).lower()
+    if matcher not in ("difflib", "tfidf", "embedding"):
+        raise ValueError(f"Unknown KB_MATCHER: {matcher}")
+    if shards is None:
+        shards = int(os.getenv("KB_SHARDS", "0"))
+    if shards > 1:
+        from backend.kb_parallel import ShardedKBIndex
+        return ShardedKBIndex(matcher, shards)
+    if matcher == "difflib":
+        return DifflibKBIndex()
+    if matcher == "tfidf":
+        from backend.kb_tfidf import TfidfKBIndex
+        return TfidfKBIndex()
+    if matcher == "embedding":
+        from backend.kb_embedding import EmbeddingKBIndex, create_embedder
+        return EmbeddingKBIndex(create_embedder(), session_factory=session_factory)
@@ -0,0 +1,80 @@
+# backend/kb_maintenance.py
+from typing import Callable, List, Tuple
+
+from sqlmodel import select, delete
+
+from backend.models import KnowledgeBase
+from backend.kb_index import DifflibKBIndex, KBEntry, same_question
+from backend.versioning import bump_table_versions, record_deletions
+
+# Compaction is two phases so the O(N^2)-ish clustering never holds the SQLite
+# write lock: rows are read and clustered outside any write transaction, then
+# one short write transaction re-checks that every row of a cluster is still
+# the version that was clustered (change_seq / updated_at) and deletes the
+# losers. A cluster touched in between is skipped and picked up next run.
+
+_SNAPSHOT_COLUMNS = (KnowledgeBase.id, KnowledgeBase.question_pattern, KnowledgeBase.answer, KnowledgeBase.source,
+                     KnowledgeBase.created_at, KnowledgeBase.updated_at, KnowledgeBase.change_seq)
+
+
+def find_duplicate_clusters(rows, threshold: float = 0.92) -> List[Tuple[object, List[object]]]:
+    """
+    Group near-duplicate rows (same_question); `rows` newest first (by updated_at).
+    Returns [(kept row, [rows merged into it])] for clusters of two or more.
+    """
+    # a private difflib index, so clusters are the same whichever engine serves search
+    index = DifflibKBIndex()
+    index.rebuild(KBEntry.from_row(r) for r in rows)
+    by_id = {r.id: r for r in rows}
+
+    clusters = []
+    for row in rows:
+        if row.id not in index:
+            continue  # already merged into a newer row
+        kept = index.get(row.id)
+        losers = []
+        for entry, _ in index.search(row.question_pattern, top_k=len(index), cutoff=threshold):
+            if entry.id != row.id and same_question(kept.normalized, kept.keywords, entry, threshold):
+                index.remove(entry.id)
+                losers.append(by_id[entry.id])
+        # drop the kept row too so later (older) rows can't claim it
+        index.remove(row.id)
+        if losers:
+            clusters.append((row, losers))
+    return clusters
+
+
+def compact_knowledge_base(session_factory: Callable, threshold: float = 0.92, chunk: int = 500) -> List[str]:
+    """
+    Merge clusters of near-duplicate KnowledgeBase rows, keeping the newest row of
+    each cluster (by updated_at) and deleting the rest. Returns the deleted ids.
+    """
+    with session_factory() as session:
+        rows = session.exec(select(*_SNAPSHOT_COLUMNS).order_by(KnowledgeBase.updated_at.desc())).all()
+    if len(rows) < 2:
+        return []
+    clusters = find_duplicate_clusters(rows, threshold)
+    if not clusters:
+        return []
+
+    with session_factory(write=True) as session:
+        ids = [r.id for kept, losers in clusters for r in [kept, *losers]]
+        current = {}
+        for start in range(0, len(ids), chunk):
+            q = select(KnowledgeBase.id, KnowledgeBase.updated_at, KnowledgeBase.change_seq).where(
+                KnowledgeBase.id.in_(ids[start:start + chunk]))
+            current.update({r.id: (r.updated_at, r.change_seq) for r in session.exec(q)})
+
+        def unchanged(row) -> bool:
+            return current.get(row.id) == (row.updated_at, row.change_seq)
+
+        removed = [loser.id for kept, losers in clusters if unchanged(kept) and all(map(unchanged, losers))
+                   for loser in losers]
+        if removed:
+            for start in range(0, len(removed), chunk):
+                session.exec(delete(KnowledgeBase).where(KnowledgeBase.id.in_(removed[start:start + chunk])))
+            # the bulk delete bypasses the flush hook: count it and leave change-feed tombstones
+            bump_table_versions(session, ["knowledgebase"])
+            record_deletions(session, "knowledgebase", removed)
+            session.commit()
+    return removed
@@ -0,0 +1,166 @@
+# backend/kb_parallel.py
+import heapq
+import multiprocessing as mp
+import threading
+import zlib
+from typing import List, Tuple
+
+from backend.kb_index import KBIndex, KBEntry, create_kb_index
+
+
+def _shard_main(conn, matcher: str):
+    """Worker process: holds one KB partition resident and answers requests from the parent."""
+    if matcher == "embedding":
+        from backend.db import get_session
+        from backend.kb_embedding import EmbeddingKBIndex, create_embedder
+        # vectors of the other shards live in the same table, so never prune "orphans" here
+        index = EmbeddingKBIndex(create_embedder(), session_factory=get_session, prune_orphans=False)
+    else:
+        index = create_kb_index(matcher, shards=0)
+
+    while True:
+        try:
+            op, args = conn.recv()
+        except EOFError:
+            break
+        try:
+            result = None
+            if op == "rebuild":
+                index.rebuild(args)
+            elif op == "upsert":
+                index.upsert(args)
+            elif op == "remove":
+                index.remove(args)
+            elif op == "search_many":
+                queries, top_k, cutoff = args
+                result = [[(e.id, s) for e, s in hits] for hits in index.search_many(queries, top_k=top_k, cutoff=cutoff)]
+            elif op == "close":
+                conn.send(("ok", None))
+                break
+            else:
+                raise ValueError(f"unknown op {op}")
+            conn.send(("ok", result))
+        except Exception as e:
+            conn.send(("error", repr(e)))
+
+
+class ShardedKBIndex(KBIndex):
+    """
+    KB index partitioned across worker processes (one resident partition each,
+    assigned by a hash of the entry id). Searches fan out to every shard in
+    parallel and the per-shard top-k lists are merged here, so scoring is not
+    bound by the parent's GIL. The parent only keeps the id -> entry map.
+    """
+
+    def __init__(self, matcher: str, shards: int):
+        super().__init__()
+        self.matcher = matcher
+        self.shards = shards
+        if matcher == "tfidf":
+            from backend.kb_tfidf import TfidfKBIndex
+            self.default_cutoffs = TfidfKBIndex.default_cutoffs
+        self._conns = []
+        self._procs = []
+        self._shard_locks: List[threading.Lock] = []
+        self._start_lock = threading.Lock()
+
+    @property
+    def signature(self) -> str:
+        return f"{type(self).__name__}:{self.shards}:{self.matcher}"
+
+    # -- worker plumbing ---------------------------------------------
+    def _ensure_started(self):
+        if self._procs:
+            return
+        with self._start_lock:
+            if self._procs:
+                return
+            # spawn: workers must not inherit the parent's DB connections or threads
+            ctx = mp.get_context("spawn")
+            conns, procs = [], []
+            for i in range(self.shards):
+                parent_conn, child_conn = ctx.Pipe()
+                proc = ctx.Process(target=_shard_main, args=(child_conn, self.matcher), name=f"kb-shard-{i}", daemon=True)
+                proc.start()
+                child_conn.close()
+                conns.append(parent_conn)
+                procs.append(proc)
+            self._conns = conns
+            self._shard_locks = [threading.Lock() for _ in range(self.shards)]
+            self._procs = procs
+
+    @staticmethod
+    def _unwrap(reply):
+        status, value = reply
+        if status != "ok":
+            raise RuntimeError(f"KB shard failed: {value}")
+        return value
+
+    def _call(self, shard: int, op: str, args=None):
+        self._ensure_started()
+        with self._shard_locks[shard]:
+            self._conns[shard].send((op, args))
+            return self._unwrap(self._conns[shard].recv())
+
+    def _call_all(self, messages: List[Tuple[str, object]]):
+        """Send one message to every shard, then collect all replies (shards work concurrently)."""
+        self._ensure_started()
+        for lock in self._shard_locks:
+            lock.acquire()
+        try:
+            for conn, message in zip(self._conns, messages):
+                conn.send(message)
+            replies = [conn.recv() for conn in self._conns]
+        finally:
+            for lock in self._shard_locks:
+                lock.release()
+        return [self._unwrap(r) for r in replies]
+
+    def _shard_of(self, entry_id: str) -> int:
+        return zlib.crc32(entry_id.encode("utf-8")) % self.shards
+
+    def close(self):
+        if not self._procs:
+            return
+        try:
+            self._call_all([("close", None)] * self.shards)
+        except Exception:
+            pass
+        for proc in self._procs:
+            proc.join(timeout=5)
+        self._procs = []
+
+    # -- index maintenance -------------------------------------------
+    def rebuild(self, entries):
+        rows = list(entries)
+        parts: List[List[KBEntry]] = [[] for _ in range(self.shards)]
+        for entry in rows:
+            parts[self._shard_of(entry.id)].append(entry)
+        with self._lock:
+            self._call_all([("rebuild", part) for part in parts])
+            self._installed({e.id: e for e in rows})
+
+    def upsert(self, entry: KBEntry):
+        # the shard replaces an existing entry itself, so this is a single round trip
+        with self._lock:
+            self._call(self._shard_of(entry.id), "upsert", entry)
+            self._entries[entry.id] = entry
+            self._applied(entry)
+            self._version += 1
+
+    def _remove(self, entry_id: str):
+        self._call(self._shard_of(entry_id), "remove", entry_id)
+
+    # -- search ------------------------------------------------------
+    def search(self, query: str, top_k: int = 3, cutoff: float = 0.45) -> List[Tuple[KBEntry, float]]:
+        return self.search_many([query], top_k=top_k, cutoff=cutoff)[0]
+
+    def search_many(self, queries: List[str], top_k: int = 3, cutoff: float = 0.45) -> List[List[Tuple[KBEntry, float]]]:
+        if top_k <= 0 or not queries:
+            return [[] for _ in queries]
+        per_shard = self._call_all([("search_many", (queries, top_k, cutoff))] * self.shards)
+        results = []
+        for qi in range(len(queries)):
+            merged = heapq.nlargest(top_k, (hit for shard in per_shard for hit in shard[qi]), key=lambda h: (h[1], h[0]))
+            results.append([(self._entries[i], s) for i, s in merged if i in self._entries])
+        return results
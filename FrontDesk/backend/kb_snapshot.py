@@ -0,0 +1,81 @@
+# backend/kb_snapshot.py
+import json
+import os
+import pickle
+import shutil
+import time
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from backend.kb_index import KBIndex
+
+SNAPSHOT_FORMAT = 2  # 2: watermark is the index's applied change_seq
+CURRENT_FILE = "CURRENT"
+
+
+def save_snapshot(index: KBIndex, directory: str) -> str:
+    """
+    Write the index to a new snapshot directory under `directory` and point
+    CURRENT at it (atomically). The snapshot's watermark is the highest
+    KnowledgeBase.change_seq the index had applied when its state was exported;
+    rows changed after it are replayed on load. Returns the snapshot path.
+    """
+    payload, arrays = index.export_state()
+    os.makedirs(directory, exist_ok=True)
+    name = f"v{payload['version']}-{int(time.time() * 1000)}"
+    tmp = os.path.join(directory, name + ".tmp")
+    os.makedirs(tmp)
+
+    for key, arr in arrays.items():
+        np.save(os.path.join(tmp, f"{key}.npy"), np.ascontiguousarray(arr))
+    with open(os.path.join(tmp, "payload.pkl"), "wb") as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "signature": index.signature,
+        "version": payload["version"],
+        "entries": len(payload["entries"]),
+        "arrays": sorted(arrays),
+        "watermark": payload["watermark"],
+        "created_at": datetime.utcnow().isoformat(),
+    }
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    final = os.path.join(directory, name)
+    os.rename(tmp, final)
+    pointer = os.path.join(directory, CURRENT_FILE + ".tmp")
+    with open(pointer, "w") as f:
+        f.write(name)
+    os.replace(pointer, os.path.join(directory, CURRENT_FILE))
+
+    # older snapshots are no longer referenced (an open memory map keeps its inode alive)
+    for other in os.listdir(directory):
+        if other not in (name, CURRENT_FILE) and other.startswith("v"):
+            shutil.rmtree(os.path.join(directory, other), ignore_errors=True)
+    return final
+
+
+def load_snapshot(index: KBIndex, directory: str) -> Optional[dict]:
+    """
+    Install the CURRENT snapshot into `index`, memory-mapping its arrays
+    (zero-copy, read-only). Returns the snapshot meta, or None when there is
+    no usable snapshot for this engine.
+    """
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            path = os.path.join(directory, f.read().strip())
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("format") != SNAPSHOT_FORMAT or meta.get("signature") != index.signature:
+        return None
+
+    arrays = {key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode="r") for key in meta["arrays"]}
+    with open(os.path.join(path, "payload.pkl"), "rb") as f:
+        payload = pickle.load(f)
+    index.import_state(payload, arrays)
+    return meta
@@ -0,0 +1,376 @@
+# backend/kb_tfidf.py
+import math
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from backend.kb_index import KBIndex, KBEntry, normalize_text, char_ngram_list
+
+
+class _DeltaRows:
+    """
+    Entries written since the matrix was built, as CSR rows over their own
+    n-gram vocabulary in growable buffers, so a write appends in O(row) and a
+    search reads the current rows without copying. Replaced/removed rows are
+    masked out.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.entries: List[KBEntry] = []
+        self.row_of: Dict[str, int] = {}
+        self.vocab: Dict[str, int] = {}
+        self._live = np.zeros(64, dtype=bool)
+        self._indptr = np.zeros(65, dtype=np.int64)
+        self._indices = np.zeros(capacity, dtype=np.int32)
+        self._data = np.zeros(capacity, dtype=np.float32)
+        self._nnz = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def _grown(buf: np.ndarray, needed: int) -> np.ndarray:
+        if needed <= len(buf):
+            return buf
+        grown = np.zeros(max(needed, 2 * len(buf)), dtype=buf.dtype)
+        grown[:len(buf)] = buf
+        return grown
+
+    def add(self, entry: KBEntry, weights: Dict[str, float]):
+        row, start, end = len(self.entries), self._nnz, self._nnz + len(weights)
+        self._live = self._grown(self._live, row + 1)
+        self._indptr = self._grown(self._indptr, row + 2)
+        self._indices = self._grown(self._indices, end)
+        self._data = self._grown(self._data, end)
+        self._indices[start:end] = [self.vocab.setdefault(g, len(self.vocab)) for g in weights]
+        self._data[start:end] = list(weights.values())
+        self._indptr[row + 1] = end
+        self._live[row] = True
+        self._nnz = end
+        self.row_of[entry.id] = row
+        self.entries.append(entry)
+
+    def remove(self, entry_id: str) -> bool:
+        row = self.row_of.pop(entry_id, None)
+        if row is None:
+            return False
+        self._live[row] = False
+        return True
+
+    def view(self):
+        """(entries, csr matrix, vocab, live mask) of the rows written so far; call under the index lock."""
+        n = len(self.entries)
+        matrix = sparse.csr_matrix(
+            (self._data[:self._nnz], self._indices[:self._nnz], self._indptr[:n + 1]),
+            shape=(n, len(self.vocab)), copy=False,
+        )
+        # entries and vocab are append-only and the buffers are only written past the
+        # current end (or replaced when grown), so readers can use them after the lock
+        # is released; vocab columns past the matrix's width are ignored by the scorers
+        return self.entries, matrix, self.vocab, self._live[:n].copy()
+
+
+class TfidfKBIndex(KBIndex):
+    """
+    KB index that stores every question_pattern as an L2-normalized char-n-gram
+    TF-IDF row. A query is scored against the whole KB with one sparse mat-vec;
+    scores are cosine similarities in [0, 1]. They are not on the difflib
+    scale ("hours?" vs "What are your hours?" is 0.63 here, 0.46 with difflib),
+    hence the engine's own default_cutoffs.
+
+    Incremental writes go to a sparse delta matrix (weighted with the current idf)
+    scored with the same sparse products, and replaced/removed matrix rows are
+    masked out. Once the delta outgrows `delta_limit` (or `delta_ratio` of the
+    KB) it is folded into a new matrix on a background thread; searches keep
+    using the current one until the new matrix is swapped in.
+    """
+
+    # picked on FAQ-style questions: unrelated pairs score lower than with difflib,
+    # close paraphrases about the same
+    default_cutoffs = {"search": 0.3, "suggest": 0.25, "answer": 0.55, "agent": 0.65}
+
+    def __init__(self, ngram_sizes: Tuple[int, ...] = (2, 3, 4), delta_limit: int = 256, delta_ratio: float = 0.1):
+        super().__init__()
+        self.ngram_sizes = ngram_sizes
+        self.delta_limit = delta_limit
+        self.delta_ratio = delta_ratio
+        self._rows: List[KBEntry] = []
+        self._row_of: Dict[str, int] = {}
+        self._live = np.zeros(0, dtype=bool)
+        self._vocab: Dict[str, int] = {}
+        self._idf = np.zeros(0, dtype=np.float32)
+        # stored column-major so a query only touches the columns of its own n-grams
+        self._matrix = sparse.csc_matrix((0, 0), dtype=np.float32)
+        self._delta = _DeltaRows()
+        # ids written while a fold is building (re-applied on top of the new matrix)
+        self._fold_changes: Optional[Set[str]] = None
+        self._fold_thread: Optional[threading.Thread] = None
+
+    def _grams(self, normalized: str) -> Counter:
+        counts = Counter()
+        for n in self.ngram_sizes:
+            counts.update(char_ngram_list(normalized, n))
+        return counts
+
+    def _build(self, rows: List[KBEntry], chunk_rows: int = 4096):
+        """
+        Matrix structures for `rows`; pure computation, runs without the lock.
+        Lists are converted to arrays every `chunk_rows` rows: one conversion of
+        the whole KB holds the GIL long enough to stall concurrent searches.
+        """
+        vocab: Dict[str, int] = {}
+        df: List[int] = []
+        lengths: List[np.ndarray] = []
+        index_chunks: List[np.ndarray] = []
+        count_chunks: List[np.ndarray] = []
+        for start in range(0, len(rows), chunk_rows):
+            row_len: List[int] = []
+            indices: List[int] = []
+            counts: List[float] = []
+            for entry in rows[start:start + chunk_rows]:
+                grams = self._grams(entry.normalized)
+                for gram, count in grams.items():
+                    col = vocab.get(gram)
+                    if col is None:
+                        col = vocab[gram] = len(df)
+                        df.append(0)
+                    df[col] += 1
+                    indices.append(col)
+                    counts.append(count)
+                row_len.append(len(grams))
+            lengths.append(np.asarray(row_len, dtype=np.int64))
+            index_chunks.append(np.asarray(indices, dtype=np.int32))
+            count_chunks.append(np.asarray(counts, dtype=np.float32))
+
+        n_docs = len(rows)
+        row_len = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64)
+        indices = np.concatenate(index_chunks) if index_chunks else np.zeros(0, dtype=np.int32)
+        data = np.concatenate(count_chunks) if count_chunks else np.zeros(0, dtype=np.float32)
+        # smoothed idf (same form as scikit-learn's TfidfVectorizer)
+        idf = (np.log((1.0 + n_docs) / (1.0 + np.asarray(df, dtype=np.float32))) + 1.0).astype(np.float32)
+        data *= idf[indices]
+        # L2-normalize each row
+        row_of_nz = np.repeat(np.arange(n_docs), row_len)
+        norms = np.sqrt(np.bincount(row_of_nz, weights=data * data, minlength=n_docs)).astype(np.float32)
+        norms[norms == 0] = 1.0
+        data /= norms[row_of_nz]
+        indptr = np.concatenate(([0], np.cumsum(row_len)))
+        matrix = sparse.csr_matrix((data, indices, indptr), shape=(n_docs, len(df)))
+        return rows, vocab, idf, matrix.tocsc()
+
+    def _swap_in(self, built, row_of=None, live=None, delta=None):
+        # under self._lock
+        rows, vocab, idf, matrix = built
+        self._rows = rows
+        self._row_of = row_of if row_of is not None else {e.id: i for i, e in enumerate(rows)}
+        self._live = live if live is not None else np.ones(len(rows), dtype=bool)
+        self._vocab = vocab
+        self._idf = idf
+        self._matrix = matrix
+        self._delta = delta if delta is not None else _DeltaRows()
+
+    def rebuild(self, entries: Iterable[KBEntry]):
+        built = self._build(list(entries))
+        with self._lock:
+            self._swap_in(built)
+            self._fold_changes = None
+            self._installed({e.id: e for e in built[0]})
+
+    @property
+    def signature(self) -> str:
+        return f"{type(self).__name__}:ngrams={','.join(map(str, self.ngram_sizes))}"
+
+    def export_state(self):
+        with self._lock:
+            version, watermark = self._version, self._applied_seq
+            if not len(self._delta) and self._live.all():
+                built = self._rows, self._vocab, self._idf, self._matrix
+            else:
+                built, entries = None, list(self._entries.values())
+        # pending writes: the snapshot gets a matrix of the current entries, built off the lock
+        rows, vocab, idf, matrix = built or self._build(entries)
+        payload = {"entries": rows, "vocab": vocab, "version": version, "watermark": watermark}
+        arrays = {"data": matrix.data, "indices": matrix.indices, "indptr": matrix.indptr, "idf": idf}
+        return payload, arrays
+
+    def import_state(self, payload: dict, arrays: dict):
+        rows = payload["entries"]
+        # arrays may be read-only memory maps; the matrix is never written in place
+        matrix = sparse.csc_matrix(
+            (arrays["data"], arrays["indices"], arrays["indptr"]),
+            shape=(len(rows), len(payload["vocab"])),
+            copy=False,
+        )
+        with self._lock:
+            self._swap_in((rows, payload["vocab"], arrays["idf"], matrix))
+            self._fold_changes = None
+            self._installed({e.id: e for e in rows})
+            self._version = payload["version"]
+
+    def _weights(self, normalized: str, built=None) -> Dict[str, float]:
+        """L2-normalized tf-idf weights keyed by n-gram, using the current idf (or that of `built`)."""
+        rows, vocab, idf, _ = built or (self._rows, self._vocab, self._idf, None)
+        unseen_idf = math.log(1.0 + len(rows)) + 1.0
+        weights = {}
+        for gram, count in self._grams(normalized).items():
+            col = vocab.get(gram)
+            weights[gram] = count * (float(idf[col]) if col is not None else unseen_idf)
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        if norm == 0:
+            return {}
+        return {gram: w / norm for gram, w in weights.items()}
+
+    def _add(self, entry: KBEntry):
+        self._delta.add(entry, self._weights(entry.normalized))
+        if self._fold_changes is not None:
+            self._fold_changes.add(entry.id)
+
+    def _remove(self, entry_id: str):
+        if not self._delta.remove(entry_id):
+            self._live[self._row_of.pop(entry_id)] = False
+        if self._fold_changes is not None:
+            self._fold_changes.add(entry_id)
+
+    def upsert(self, entry: KBEntry):
+        with self._lock:
+            super().upsert(entry)
+            if (self._fold_thread is None
+                    and len(self._delta) > max(self.delta_limit, self.delta_ratio * len(self._rows))):
+                self._fold_changes = set()
+                self._fold_thread = threading.Thread(
+                    target=self._fold, args=(list(self._entries.values()),), name="kb-tfidf-fold", daemon=True)
+                self._fold_thread.start()
+
+    def _fold(self, entries: List[KBEntry], catchup_rounds: int = 3):
+        """
+        Build a matrix of `entries` off the lock, then swap it in. Writes made
+        meanwhile are replayed onto the new matrix's delta in catch-up rounds,
+        also off the lock; only those of the last round are applied while holding it.
+        """
+        try:
+            built = self._build(entries)
+            row_of = {e.id: i for i, e in enumerate(built[0])}
+            live = np.ones(len(row_of), dtype=bool)
+            delta = _DeltaRows()
+
+            def replay(changed):
+                for entry_id, entry in changed:
+                    row = row_of.pop(entry_id, None)
+                    if row is not None:
+                        live[row] = False
+                    delta.remove(entry_id)
+                    if entry is not None:
+                        delta.add(entry, self._weights(entry.normalized, built))
+
+            for _ in range(catchup_rounds):
+                with self._lock:
+                    if self._fold_changes is None:
+                        break
+                    changed = [(i, self._entries.get(i)) for i in self._fold_changes]
+                    self._fold_changes = set()
+                if not changed:
+                    break
+                replay(changed)
+
+            with self._lock:
+                if self._fold_changes is not None:  # None: a full rebuild/import replaced the index meanwhile
+                    replay([(i, self._entries.get(i)) for i in self._fold_changes])
+                    self._swap_in(built, row_of, live, delta)
+                self._fold_changes = None
+                self._fold_thread = None
+        except Exception as e:
+            print(f"[KB] TF-IDF fold failed: {e}")
+            with self._lock:
+                self._fold_changes = None
+                self._fold_thread = None
+
+    def wait_for_fold(self, timeout: Optional[float] = None):
+        thread = self._fold_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    @staticmethod
+    def _top_rows(hit_rows, hit_scores, live, floor: float, top_k: int):
+        keep = (hit_scores >= floor) & live[hit_rows]
+        hit_rows, hit_scores = hit_rows[keep], hit_scores[keep]
+        if hit_rows.size > top_k:
+            best = np.argpartition(-hit_scores, top_k - 1)[:top_k]
+            hit_rows, hit_scores = hit_rows[best], hit_scores[best]
+        return zip(hit_rows, hit_scores)
+
+    def _score_one(self, rows, matrix, vocab, live, qw: Dict[str, float], floor: float, top_k: int):
+        n_cols = matrix.shape[1]
+        cols = [(vocab[g], w) for g, w in qw.items() if vocab.get(g, n_cols) < n_cols]
+        if not cols or not matrix.shape[0]:
+            return []
+        col_ids = np.fromiter((c for c, _ in cols), dtype=np.int64, count=len(cols))
+        col_w = np.fromiter((w for _, w in cols), dtype=np.float32, count=len(cols))
+        scores = matrix[:, col_ids].dot(col_w)
+        all_rows = np.arange(scores.shape[0])
+        return [(rows[r], float(sc)) for r, sc in self._top_rows(all_rows, scores, live, floor, top_k)]
+
+    def search(self, query: str, top_k: int = 3, cutoff: float = 0.45) -> List[Tuple[KBEntry, float]]:
+        q = normalize_text(query)
+        if not q or top_k <= 0:
+            return []
+        with self._lock:
+            main = self._rows, self._matrix, self._vocab, self._live
+            delta = self._delta.view()
+            qw = self._weights(q)
+
+        floor = max(cutoff, 1e-9)
+        results = self._score_one(*main, qw, floor, top_k) + self._score_one(*delta, qw, floor, top_k)
+        results.sort(key=lambda r: (-r[1], r[0].id))
+        return results[:top_k]
+
+    def _score_many(self, rows, matrix, vocab, live, weights, floor: float, top_k: int, results, chunk_size: int):
+        if not matrix.shape[0]:
+            return
+        n_cols = matrix.shape[1]
+        for start in range(0, len(weights), chunk_size):
+            chunk = weights[start:start + chunk_size]
+            q_rows, q_cols, q_vals = [], [], []
+            for j, qw in enumerate(chunk):
+                for g, w in qw.items():
+                    col = vocab.get(g, n_cols)
+                    if col < n_cols:
+                        q_rows.append(col)
+                        q_cols.append(j)
+                        q_vals.append(w)
+            if not q_vals:
+                continue
+            query_matrix = sparse.csc_matrix(
+                (np.asarray(q_vals, dtype=np.float32), (q_rows, q_cols)),
+                shape=(matrix.shape[1], len(chunk)),
+            )
+            # N x len(chunk) sparse scores: only rows sharing an n-gram with a query are stored
+            scores = matrix.dot(query_matrix).tocsc()
+            for j in range(len(chunk)):
+                lo, hi = scores.indptr[j], scores.indptr[j + 1]
+                top = self._top_rows(scores.indices[lo:hi], scores.data[lo:hi], live, floor, top_k)
+                results[start + j].extend((rows[r], float(sc)) for r, sc in top)
+
+    def search_many(self, queries: List[str], top_k: int = 3, cutoff: float = 0.45,
+                    chunk_size: int = 64) -> List[List[Tuple[KBEntry, float]]]:
+        """
+        Score all queries against the KB (and the delta) with one sparse mat-mat
+        product per chunk of queries (chunking bounds the size of the score matrix).
+        """
+        results: List[List[Tuple[KBEntry, float]]] = [[] for _ in queries]
+        if top_k <= 0:
+            return results
+        with self._lock:
+            main = self._rows, self._matrix, self._vocab, self._live
+            delta = self._delta.view()
+            weights = [self._weights(normalize_text(q)) for q in queries]
+
+        floor = max(cutoff, 1e-9)
+        self._score_many(*main, weights, floor, top_k, results, chunk_size)
+        self._score_many(*delta, weights, floor, top_k, results, chunk_size)
+        for res in results:
+            res.sort(key=lambda r: (-r[1], r[0].id))
+            del res[top_k:]
+        return results
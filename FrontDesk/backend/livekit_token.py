@@ -1,10 +1,12 @@
 
 # backend/livekit_token.py
 import os
+import threading
 import time
 import jwt  # pyjwt
+from collections import OrderedDict
 from dotenv import load_dotenv
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 load_dotenv()
 
@@ -16,15 +18,24 @@ LIVEKIT_API_SECRET = os.getenv("LIVEKIT_API_SECRET", "ui9rVdsLhFzSaVJeAa1hYuxuEV
 #  API_KEY = os.getenv("LIVEKIT_API_KEY", "APIZEQka6PvBsVE")
 #  API_SECRET = os.getenv("LIVEKIT_API_SECRET", "ui9rVdsLhFzSaVJeAa1hYuxuEVDDVSpffWcDQSezDdWC")
 
-def generate_join_token(identity: str, room: Optional[str] = None, ttl_seconds: int = 60*60):
+# Join tokens are reused per (identity, room) until TOKEN_REUSE_FRACTION of their
+# TTL has passed, so a reconnect storm re-serves cached tokens instead of
+# re-signing; a reused token always has at least (1 - fraction) of its TTL left.
+TOKEN_TTL_SECONDS = int(os.getenv("TOKEN_TTL_SECONDS", str(60*60)))
+TOKEN_REUSE_FRACTION = float(os.getenv("TOKEN_REUSE_FRACTION", "0.5"))  # 0 disables reuse
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+
+def generate_join_token(identity: str, room: Optional[str] = None, ttl_seconds: int = TOKEN_TTL_SECONDS,
+                        now: Optional[int] = None):
     """
     Generate a LiveKit join token (JWT). identity is the client identity (username).
-    room optional restricts token to a specific room.
+    room optional restricts token to a specific room. Always signs a new token;
+    request handlers go through token_cache.
     """
     if not LIVEKIT_API_KEY or not LIVEKIT_API_SECRET:
         raise RuntimeError("LIVEKIT_API_KEY and LIVEKIT_API_SECRET must be set in environment")
 
-    now = int(time.time())
+    now = int(time.time()) if now is None else now
     payload = {
         "jti": f"{identity}-{now}",
         "iss": LIVEKIT_API_KEY,
@@ -40,3 +51,40 @@ def generate_join_token(identity: str, room: Optional[str] = None, ttl_seconds:
     if isinstance(token, bytes):
         token = token.decode("utf-8")
     return token
+
+
+class TokenCache:
+    """Bounded LRU of signed join tokens keyed by (identity, room, ttl)."""
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_SIZE, reuse_fraction: float = TOKEN_REUSE_FRACTION):
+        self.max_entries = max_entries
+        self.reuse_fraction = reuse_fraction
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Tuple, Tuple[str, int, int]]" = OrderedDict()  # key -> (token, issued_at, expires_at)
+
+    def get(self, identity: str, room: Optional[str] = None, ttl_seconds: int = TOKEN_TTL_SECONDS) -> Tuple[str, int]:
+        """A join token for (identity, room) and its expiry (unix seconds); reused while fresh enough."""
+        key = (identity, room or "*", ttl_seconds)
+        now = time.time()
+        if self.max_entries > 0 and self.reuse_fraction > 0:
+            with self._lock:
+                item = self._data.get(key)
+                if item and now < item[1] + ttl_seconds * self.reuse_fraction:
+                    self._data.move_to_end(key)
+                    return item[0], item[2]
+        issued_at = int(now)
+        token = generate_join_token(identity, room, ttl_seconds, now=issued_at)
+        expires_at = issued_at + ttl_seconds
+        if self.max_entries > 0 and self.reuse_fraction > 0:
+            with self._lock:
+                self._data[key] = (token, issued_at, expires_at)
+                self._data.move_to_end(key)
+                while len(self._data) > self.max_entries:
+                    self._data.popitem(last=False)
+        return token, expires_at
+
+    def get_many(self, identities: List[str], room: Optional[str] = None, ttl_seconds: int = TOKEN_TTL_SECONDS) -> Dict[str, Tuple[str, int]]:
+        return {identity: self.get(identity, room, ttl_seconds) for identity in identities}
+
+
+token_cache = TokenCache()
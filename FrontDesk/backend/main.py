@@ -4,24 +4,83 @@
 
 
 # backend/main.py
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import json
 import os
+import threading
+import time
 from datetime import datetime
-import difflib
 
-from backend.db import init_db, get_session
-from backend.models import HelpRequest, KnowledgeBase
-from backend.livekit_token import generate_join_token  # uses your livekit token implementation
+from backend.db import init_db, get_session, get_db, get_write_db, async_engine
+from backend.events import EVENTS_HEARTBEAT, bus as event_bus, event_stream
+from backend.models import HelpRequest, HelpRequestArchive, KnowledgeBase
+from backend.kb_index import KBEntry, create_kb_index, keyword_set, is_relevant, normalize_text
+from backend.kb_cache import KBQueryCache
+from backend.kb_maintenance import compact_knowledge_base
+from backend.kb_snapshot import save_snapshot, load_snapshot
+from backend.retention import archive_help_requests
+from backend.pagination import PAGE_LIMIT_MAX, fetch_page, parse_fields, row_values
+from backend.serialization import dumps_json, encode_response, representation
+from backend.versioning import CHANGE_SEQ, etag_matches, fetch_changes, list_etag, row_etag, table_version
+from backend.livekit_token import token_cache  # uses your livekit token implementation
 
 load_dotenv()
 
 app = FastAPI(title="FrontDesk Human-in-loop Backend (with KB)")
 init_db()
 
+# Resident KB index: built once at startup, searched by find_kb_matches.
+# KB_MATCHER selects the scoring engine ("difflib", "tfidf" or "embedding").
+kb_index = create_kb_index(session_factory=get_session)
+# Query-result cache in front of KB search (KB_CACHE_SIZE=0 disables it)
+kb_cache = KBQueryCache(
+    max_entries=int(os.getenv("KB_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("KB_CACHE_TTL", "300")),
+)
+# Near-duplicate question patterns (difflib ratio >= threshold) update one KB row instead of adding another
+KB_DEDUPE_THRESHOLD = float(os.getenv("KB_DEDUPE_THRESHOLD", "0.92"))
+# Seconds between background KB compaction runs (0 disables the background job)
+KB_COMPACT_INTERVAL = float(os.getenv("KB_COMPACT_INTERVAL", "0"))
+# On-disk KB index snapshot (memory-mapped at startup); empty KB_SNAPSHOT_DIR disables snapshots
+KB_SNAPSHOT_DIR = os.getenv("KB_SNAPSHOT_DIR", "kb_snapshot")
+KB_SNAPSHOT_INTERVAL = float(os.getenv("KB_SNAPSHOT_INTERVAL", "300"))
+# List endpoints return pages of this size unless ?limit= is given (max PAGE_LIMIT_MAX)
+PAGE_LIMIT_DEFAULT = int(os.getenv("PAGE_LIMIT_DEFAULT", "50"))
+# default GET /learned-answers columns (normalized_pattern is internal)
+LEARNED_ANSWER_FIELDS = "id,question_pattern,answer,created_at,updated_at,source"
+# GET /changes page size bound
+CHANGES_LIMIT_MAX = 1000
+# answers per POST /help-requests/respond/bulk call
+RESPOND_BULK_MAX = 1000
+# identities per POST /token/batch call
+TOKEN_BATCH_MAX = 1000
+# queries / top_k per POST /kb/search/batch call
+KB_SEARCH_BATCH_MAX = 100
+KB_SEARCH_TOP_K_MAX = 50
+# rows per transaction (import) / per fetch (export) for the NDJSON KB endpoints
+KB_IMPORT_BATCH = int(os.getenv("KB_IMPORT_BATCH", "500"))
+KB_IMPORT_MAX_LINE = 1 << 20
+# Resolved/unresolved requests older than RETENTION_DAYS move to helprequest_archive
+# (0 disables the background job), RETENTION_BATCH rows per write transaction
+RETENTION_DAYS = float(os.getenv("RETENTION_DAYS", "0"))
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "3600"))
+RETENTION_BATCH = int(os.getenv("RETENTION_BATCH", "500"))
+# Blocking KB work (scoring, index rebuilds, embedding) runs on this pool, never on the event loop
+kb_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("KB_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    thread_name_prefix="kb",
+)
+
 # -------------------------
 # Pydantic payload models
 # -------------------------
@@ -35,67 +94,409 @@ class SupervisorAnswer(BaseModel):
     status: str  # "resolved" or "unresolved"
     save_to_kb: Optional[bool] = False  # optional flag to explicitly save to KB
 
+class BulkSupervisorAnswer(SupervisorAnswer):
+    id: int
+
+class BulkRespond(BaseModel):
+    answers: List[BulkSupervisorAnswer]
+
 class KBCreate(BaseModel):
     question_pattern: str
     answer: str
     source: Optional[str] = "MANUAL"
 
+class AgentAsk(BaseModel):
+    caller_name: str
+    question: str
+    livekit_room: Optional[str] = None
+    kb_cutoff: Optional[float] = None  # minimum KB score to answer directly (default: the engine's "agent" cutoff)
+    top_k: int = 3
+
+class TokenBatch(BaseModel):
+    identities: List[str]
+    room: Optional[str] = None
+
+class KBBatchSearch(BaseModel):
+    queries: List[str]
+    top_k: int = 3
+    cutoff: float = 0.0
+
+# -------------------------
+# Response models (OpenAPI schema of the read endpoints; those handlers return
+# pre-encoded bodies, see backend/serialization.py). Fields are optional
+# because ?fields= selects a subset of columns.
+# -------------------------
+class HelpRequestOut(BaseModel):
+    id: Optional[int] = None
+    caller_name: Optional[str] = None
+    question: Optional[str] = None
+    status: Optional[str] = None
+    supervisor_response: Optional[str] = None
+    created_at: Optional[datetime] = None
+    resolved_at: Optional[datetime] = None
+    livekit_room: Optional[str] = None
+    follow_up_sent: Optional[bool] = None
+    version: Optional[int] = None
+    change_seq: Optional[int] = None
+
+class ArchivedHelpRequestOut(BaseModel):
+    id: Optional[int] = None
+    caller_name: Optional[str] = None
+    question: Optional[str] = None
+    status: Optional[str] = None
+    supervisor_response: Optional[str] = None
+    created_at: Optional[datetime] = None
+    resolved_at: Optional[datetime] = None
+    livekit_room: Optional[str] = None
+    follow_up_sent: Optional[bool] = None
+    archived_at: Optional[datetime] = None
+
+class LearnedAnswerOut(BaseModel):
+    id: Optional[str] = None
+    question_pattern: Optional[str] = None
+    answer: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    source: Optional[str] = None
+    normalized_pattern: Optional[str] = None
+    change_seq: Optional[int] = None
+
+class KBMatchOut(BaseModel):
+    id: str
+    question_pattern: str
+    answer: str
+    source: str
+    score: float
+    created_at: Optional[datetime] = None
+
+class KBBatchResultOut(BaseModel):
+    query: str
+    matches: List[KBMatchOut]
+
+class DeletedOut(BaseModel):
+    table: str
+    id: str
+    change_seq: int
+
+class ChangesOut(BaseModel):
+    help_requests: List[HelpRequestOut]
+    learned_answers: List[LearnedAnswerOut]
+    deleted: List[DeletedOut]
+    cursor: int
+    has_more: bool
+
 # -------------------------
 # Helper: KB fuzzy search
 # -------------------------
-def find_kb_matches(query: str, top_k: int = 3, cutoff: float = 0.45):
+async def run_kb(fn, *args, **kwargs):
+    """Await a blocking KB call on kb_executor."""
+    return await asyncio.get_running_loop().run_in_executor(kb_executor, functools.partial(fn, *args, **kwargs))
+
+def load_kb_index():
+    """(Re)build the resident KB index from the KnowledgeBase table."""
+    with get_session() as session:
+        rows = session.exec(select(KnowledgeBase)).all()
+        kb_index.rebuild(KBEntry.from_row(r) for r in rows)
+    kb_cache.invalidate()
+
+def kb_changed(*rows: KnowledgeBase):
+    """Apply committed KnowledgeBase inserts/updates to the index and drop cached results."""
+    for kb in rows:
+        kb_index.upsert(KBEntry.from_row(kb))
+    kb_cache.invalidate()
+
+def kb_imported(entries: Optional[List[KBEntry]]):
+    """One index update after an import: the imported entries, or a full rebuild (entries=None) for large imports."""
+    if entries is None:
+        load_kb_index()
+        return
+    for entry in entries:
+        kb_index.upsert(entry)
+    kb_cache.invalidate()
+
+def kb_removed(kb_ids: List[str]):
+    for kb_id in kb_ids:
+        kb_index.remove(kb_id)
+    kb_cache.invalidate()
+
+def find_kb_duplicate(question_pattern: str):
+    if kb_index.stale:
+        load_kb_index()
+    return kb_index.find_duplicate(question_pattern, threshold=KB_DEDUPE_THRESHOLD)
+
+def find_kb_duplicates(question_patterns: List[str]):
+    return [find_kb_duplicate(p) for p in question_patterns]
+
+async def lookup_kb_duplicates(question_patterns: List[str]) -> Dict[str, Optional[KBEntry]]:
     """
-    Simple fuzzy search against KnowledgeBase.question_pattern values.
-    Returns a list of dicts with id, question_pattern, answer, score, source.
+    Near-duplicate KB entry (or None) of each pattern, keyed by normalized pattern.
+    Await it before the first statement of a write session: the lookups run on the
+    KB executor, where they can queue behind searches, and must not hold the write lock.
+    """
+    patterns = {normalize_text(p): p for p in question_patterns}
+    if not patterns:
+        return {}
+    return dict(zip(patterns, await run_kb(find_kb_duplicates, list(patterns.values()))))
+
+async def upsert_kb_answer(session: AsyncSession, question_pattern: str, answer: str, source: str,
+                           duplicates: Optional[Dict[str, Optional[KBEntry]]] = None):
+    """
+    Stage a KB write: refresh the answer of an existing near-duplicate pattern
+    (newest answer wins) or add a new row. Returns (row, created).
     """
+    return (await upsert_kb_answers(session, [(question_pattern, answer, source)], duplicates))[0]
+
+async def upsert_kb_answers(session: AsyncSession, items: List[tuple],
+                            duplicates: Optional[Dict[str, Optional[KBEntry]]] = None):
+    """
+    upsert_kb_answer for many (question_pattern, answer, source) items. Rows are
+    matched by normalized_pattern first, then through `duplicates` (from
+    lookup_kb_duplicates, fetched before the write transaction; None skips the
+    fuzzy match). Items that normalize alike share a row (the last answer wins).
+    Returns [(row, created)] in item order.
+    """
+    normalized = [normalize_text(p) for p, _, _ in items]
+    by_pattern = {}
+    if items:
+        # exact repeats hit the normalized_pattern index; only new wording uses the fuzzy match
+        q = select(KnowledgeBase).where(KnowledgeBase.normalized_pattern.in_(set(normalized)))
+        for kb in (await session.exec(q)).all():
+            by_pattern.setdefault(kb.normalized_pattern, kb)
+    dups = {n: duplicates.get(n) for n in normalized if n not in by_pattern} if duplicates else {}
+    dup_ids = {d.id for d in dups.values() if d}
+    if dup_ids:
+        # the entry may have been merged or deleted since the lookup: then a new row is added
+        rows = {kb.id: kb for kb in (await session.exec(select(KnowledgeBase).where(KnowledgeBase.id.in_(dup_ids)))).all()}
+        for n, dup in dups.items():
+            if dup and dup.id in rows:
+                by_pattern[n] = rows[dup.id]
+
+    out = []
+    for (question_pattern, answer, source), n in zip(items, normalized):
+        kb = by_pattern.get(n)
+        if kb:
+            kb.answer = answer
+            kb.source = source
+            kb.updated_at = datetime.utcnow()
+            created = False
+        else:
+            kb = by_pattern[n] = KnowledgeBase(question_pattern=question_pattern, normalized_pattern=n, answer=answer, source=source)
+            created = True
+        session.add(kb)
+        out.append((kb, created))
+    return out
+
+def run_kb_compaction():
+    removed = compact_knowledge_base(get_session, threshold=KB_DEDUPE_THRESHOLD)
+    if removed:
+        kb_removed(removed)
+    return removed
+
+def _kb_compaction_loop():
+    while True:
+        time.sleep(KB_COMPACT_INTERVAL)
+        try:
+            removed = run_kb_compaction()
+            if removed:
+                print(f"KB compaction merged {len(removed)} near-duplicate entries")
+        except Exception as e:
+            print(f"KB compaction failed: {e}")
+
+def _retention_loop():
+    while True:
+        try:
+            moved = archive_help_requests(get_session, RETENTION_DAYS, batch_size=RETENTION_BATCH, pause=0.05)
+            if moved:
+                print(f"Retention archived {moved} help requests older than {RETENTION_DAYS:g} days")
+        except Exception as e:
+            print(f"Retention job failed: {e}")
+        time.sleep(RETENTION_INTERVAL)
+
+_snapshot_version = None
+
+def save_kb_snapshot():
+    """Write the KB index to KB_SNAPSHOT_DIR, tagged with its version and applied change_seq (the watermark)."""
+    global _snapshot_version
+    path = save_snapshot(kb_index, KB_SNAPSHOT_DIR)
+    _snapshot_version = kb_index.version
+    return path
+
+def restore_kb_snapshot() -> bool:
+    """
+    Memory-map the last KB snapshot, then replay only KnowledgeBase rows changed
+    since its watermark (and drop rows deleted since). False if there is no usable snapshot.
+    """
+    global _snapshot_version
+    try:
+        meta = load_snapshot(kb_index, KB_SNAPSHOT_DIR)
+    except Exception as e:
+        print(f"KB snapshot load failed, rebuilding from DB: {e}")
+        return False
+    if meta is None:
+        return False
+    _snapshot_version = meta["version"]
+
     with get_session() as session:
-        rows = session.exec(select(KnowledgeBase)).all()
-        if not rows:
-            return []
-
-        patterns = [r.question_pattern for r in rows]
-        # Use the provided cutoff so callers can control strictness.
-        close = difflib.get_close_matches(query, patterns, n=top_k, cutoff=cutoff)
-        results = []
-        for match in close:
-            for r in rows:
-                if r.question_pattern == match:
-                    score = difflib.SequenceMatcher(None, query, r.question_pattern).ratio()
-                    results.append({
-                        "id": r.id,
-                        "question_pattern": r.question_pattern,
-                        "answer": r.answer,
-                        "source": r.source,
-                        "score": round(score, 3),
-                        "created_at": r.created_at.isoformat() if r.created_at else None
-                    })
-    results.sort(key=lambda x: x["score"], reverse=True)
-    return results
+        seqs = dict(session.exec(select(KnowledgeBase.id, KnowledgeBase.change_seq)).all())
+        # rows after the watermark, plus older ones the index never got: rows applied out of
+        # commit order (an import pushes its rows to the index only when it finishes)
+        stale = [kb_id for kb_id, seq in seqs.items()
+                 if seq is None or seq > meta["watermark"] or getattr(kb_index.get(kb_id), "change_seq", None) != seq]
+        changed = []
+        for start in range(0, len(stale), 500):
+            changed += session.exec(select(KnowledgeBase).where(KnowledgeBase.id.in_(stale[start:start + 500]))).all()
+    for row in changed:
+        kb_index.upsert(KBEntry.from_row(row))
+    for kb_id in kb_index.ids():
+        if kb_id not in seqs:
+            kb_index.remove(kb_id)
+    kb_cache.invalidate()
+    print(f"KB snapshot v{meta['version']} loaded ({meta['entries']} entries), replayed {len(changed)} changed rows")
+    return True
+
+def _kb_snapshot_loop():
+    while True:
+        time.sleep(KB_SNAPSHOT_INTERVAL)
+        if kb_index.version != _snapshot_version:
+            try:
+                save_kb_snapshot()
+            except Exception as e:
+                print(f"KB snapshot failed: {e}")
+
+@app.on_event("startup")
+def warm_kb_index():
+    if not (KB_SNAPSHOT_DIR and restore_kb_snapshot()):
+        load_kb_index()
+        if KB_SNAPSHOT_DIR:
+            save_kb_snapshot()
+    if KB_COMPACT_INTERVAL > 0:
+        threading.Thread(target=_kb_compaction_loop, daemon=True).start()
+    if KB_SNAPSHOT_DIR and KB_SNAPSHOT_INTERVAL > 0:
+        threading.Thread(target=_kb_snapshot_loop, daemon=True).start()
+    if RETENTION_DAYS > 0:
+        threading.Thread(target=_retention_loop, daemon=True).start()
+
+@app.on_event("startup")
+async def start_event_bus():
+    event_bus.bind(asyncio.get_running_loop())
+
+@app.on_event("shutdown")
+def persist_kb_index():
+    if KB_SNAPSHOT_DIR and kb_index.version != _snapshot_version:
+        save_kb_snapshot()
+    kb_index.close()
+    kb_executor.shutdown(wait=False)
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    await async_engine.dispose()
+
+def _kb_result(entry: KBEntry, score: float):
+    return {
+        "id": entry.id,
+        "question_pattern": entry.question_pattern,
+        "answer": entry.answer,
+        "source": entry.source,
+        "score": round(score, 3),
+        "created_at": entry.created_at,
+    }
+
+def kb_cutoff_or_default(cutoff: Optional[float], use: str) -> float:
+    """`cutoff`, or the KB engine's default for `use` (see KBIndex.default_cutoffs)."""
+    return kb_index.default_cutoffs[use] if cutoff is None else cutoff
+
+def _score_kb_matches(query: str, top_k: int, cutoff: float):
+    version = kb_index.version
+    results = [_kb_result(entry, score) for entry, score in kb_index.search(query, top_k=top_k, cutoff=cutoff)]
+    kb_cache.put(query, top_k, cutoff, version, results)
+    return list(results)
+
+def find_kb_matches(query: str, top_k: int = 3, cutoff: Optional[float] = None):
+    """
+    Fuzzy search against KnowledgeBase.question_pattern values using the resident KB index.
+    Returns a list of dicts with id, question_pattern, answer, score, source.
+    """
+    cutoff = kb_cutoff_or_default(cutoff, "search")
+    if kb_index.stale:
+        load_kb_index()
+    results = kb_cache.get(query, top_k, cutoff, kb_index.version)
+    if results is None:
+        return _score_kb_matches(query, top_k, cutoff)
+    return list(results)
+
+async def find_kb_matches_async(query: str, top_k: int = 3, cutoff: Optional[float] = None):
+    """find_kb_matches for request handlers: cache hits are served on the loop, scoring runs on kb_executor."""
+    cutoff = kb_cutoff_or_default(cutoff, "search")
+    if kb_index.stale:
+        return await run_kb(find_kb_matches, query, top_k, cutoff)
+    results = kb_cache.get(query, top_k, cutoff, kb_index.version)
+    if results is None:
+        return await run_kb(_score_kb_matches, query, top_k, cutoff)
+    return list(results)
+
+def find_kb_matches_batch(queries: List[str], top_k: int = 3, cutoff: Optional[float] = None):
+    """
+    Like find_kb_matches for many queries at once; cache misses are scored
+    together by the KB index. Batch results are served from the cache but not
+    added to it, so one large batch cannot evict the single-query entries.
+    """
+    cutoff = kb_cutoff_or_default(cutoff, "search")
+    if kb_index.stale:
+        load_kb_index()
+    version = kb_index.version
+    out = [kb_cache.get(q, top_k, cutoff, version) for q in queries]
+    missing = [i for i, r in enumerate(out) if r is None]
+    if missing:
+        batches = kb_index.search_many([queries[i] for i in missing], top_k=top_k, cutoff=cutoff)
+        for i, matches in zip(missing, batches):
+            out[i] = [_kb_result(entry, score) for entry, score in matches]
+    return [list(r) for r in out]
 
 # -------------------------
-# Token endpoint (unchanged)
+# Token endpoints (cached per identity + room, see backend/livekit_token.py)
 # -------------------------
 @app.post("/token")
-def token(identity: str, room: Optional[str] = None):
+async def token(identity: str, room: Optional[str] = None):
+    try:
+        t, expires_at = token_cache.get(identity, room)
+        return {"token": t, "expires_at": expires_at, "livekit_url": os.getenv("LIVEKIT_URL")}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/token/batch")
+async def token_batch(payload: TokenBatch):
+    """Join tokens for many identities (e.g. a pool of agents) in one call, all for the same room."""
+    if len(payload.identities) > TOKEN_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {TOKEN_BATCH_MAX} identities per call")
+    if len(set(payload.identities)) != len(payload.identities):
+        raise HTTPException(status_code=400, detail="Each identity may appear only once")
     try:
-        t = generate_join_token(identity=identity, room=room)
-        return {"token": t, "livekit_url": os.getenv("LIVEKIT_URL")}
+        minted = token_cache.get_many(payload.identities, payload.room)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "livekit_url": os.getenv("LIVEKIT_URL"),
+        "tokens": [{"identity": i, "token": minted[i][0], "expires_at": minted[i][1]} for i in payload.identities],
+    }
 
 # -------------------------
 # Create help request (but first check KB)
 # -------------------------
 @app.post("/help-requests", response_model=dict)
-def create_help_request(payload: CreateHelpRequest, kb_cutoff: float = 0.55, kb_search_cutoff: float = 0.35):
+async def create_help_request(payload: CreateHelpRequest, kb_cutoff: Optional[float] = None,
+                              kb_search_cutoff: Optional[float] = None,
+                              session: AsyncSession = Depends(get_write_db)):
     """
     Called by the agent when handling a customer query.
     First check KB (fuzzy) using kb_search_cutoff to filter irrelevant patterns.
     If best match score >= kb_cutoff: return kb match and do NOT create request.
     Otherwise create a pending HelpRequest and return its id.
+    Both cutoffs default to the KB engine's ("suggest" / "answer").
     """
+    kb_cutoff = kb_cutoff_or_default(kb_cutoff, "answer")
+    kb_search_cutoff = kb_cutoff_or_default(kb_search_cutoff, "suggest")
     # 1) Check KB for possible answer — use a modest cutoff to avoid too-loose matches
-    suggestions = find_kb_matches(payload.question, top_k=3, cutoff=kb_search_cutoff)
+    suggestions = await find_kb_matches_async(payload.question, top_k=3, cutoff=kb_search_cutoff)
     best = suggestions[0] if suggestions else None
 
     if best and best["score"] >= kb_cutoff:
@@ -107,134 +508,465 @@ def create_help_request(payload: CreateHelpRequest, kb_cutoff: float = 0.55, kb_
         }
 
     # Create pending help request (no confident KB match)
-    with get_session() as session:
-        req = HelpRequest(
-            caller_name=payload.caller_name,
-            question=payload.question,
-            status="pending",
-            livekit_room=payload.livekit_room
-        )
-        session.add(req)
-        session.commit()
-        session.refresh(req)
+    req = HelpRequest(
+        caller_name=payload.caller_name,
+        question=payload.question,
+        status="pending",
+        livekit_room=payload.livekit_room
+    )
+    session.add(req)
+    await session.commit()
+
+    # Also include any lower-confidence KB suggestion if present (useful)
+    kb_suggestion = best if best else None
+
+    return {"created": True, "id": req.id, "status": req.status, "message": "Supervisor notified.", "kb_suggestion": kb_suggestion}
+
+# -------------------------
+# Agent turn: answer from KB or escalate, in one call
+# -------------------------
+@app.post("/agent/ask", response_model=dict)
+async def agent_ask(payload: AgentAsk, session: AsyncSession = Depends(get_write_db)):
+    """
+    One call per caller turn: KB search, keyword relevance gate and (if needed)
+    escalation. Returns decision "answer" with the KB answer, or "escalated"
+    with the id of the new pending HelpRequest.
+    """
+    suggestions = await find_kb_matches_async(payload.question, top_k=payload.top_k, cutoff=0.0)
+    best = suggestions[0] if suggestions else None
 
-        # Also include any lower-confidence KB suggestion if present (useful)
-        kb_suggestion = best if best else None
+    if best and best["score"] >= kb_cutoff_or_default(payload.kb_cutoff, "agent"):
+        entry = kb_index.get(best["id"])
+        if entry and is_relevant(keyword_set(payload.question), entry):
+            return {"decision": "answer", "answer": best["answer"], "kb_match": best, "suggestions": suggestions}
 
-        return {"created": True, "id": req.id, "status": req.status, "message": "Supervisor notified (simulated).", "kb_suggestion": kb_suggestion}
+    req = HelpRequest(
+        caller_name=payload.caller_name,
+        question=payload.question,
+        status="pending",
+        livekit_room=payload.livekit_room
+    )
+    session.add(req)
+    await session.commit()
+    return {"decision": "escalated", "id": req.id, "status": req.status, "kb_suggestion": best, "suggestions": suggestions}
 
 # -------------------------
 # List help requests
 # -------------------------
-@app.get("/help-requests", response_model=List[dict])
-def list_help_requests(status: Optional[str] = None):
-    with get_session() as session:
-        q = select(HelpRequest)
-        if status:
-            q = q.where(HelpRequest.status == status)
-        rows = session.exec(q).all()
-        result = []
-        for r in rows:
-            result.append({
-                "id": r.id,
-                "caller_name": r.caller_name,
-                "question": r.question,
-                "status": r.status,
-                "supervisor_response": r.supervisor_response,
-                "created_at": r.created_at.isoformat(),
-                "resolved_at": r.resolved_at.isoformat() if r.resolved_at else None,
-                "livekit_room": r.livekit_room,
-                "follow_up_sent": r.follow_up_sent,
-            })
-        return result
+def conditional(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Set the validator headers; returns a 304 response when the client's copy is current."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+@app.get("/help-requests", response_model=List[HelpRequestOut])
+async def list_help_requests(
+    request: Request,
+    response: Response,
+    status: Optional[str] = None,
+    limit: int = Query(PAGE_LIMIT_DEFAULT, ge=1, le=PAGE_LIMIT_MAX),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    One page of help requests ordered by (created_at, id). Pass the X-Next-Cursor
+    response header back as `cursor` for the next page; `fields=id,status,...`
+    selects only those columns. Supports If-None-Match (ETag changes with any
+    help request write).
+    """
+    columns = parse_fields(HelpRequest, fields)
+    # version and page are read in the same transaction, so the ETag matches the body
+    version = await table_version(session, "helprequest")
+    etag = list_etag("helprequest", version, dict(status=status, limit=limit, cursor=cursor, fields=fields, order=order,
+                                                   fmt=representation(request)))
+    if (cached := conditional(request, response, etag)) is not None:
+        return cached
+    filters = [HelpRequest.status == status] if status else []
+    rows, next_cursor = await fetch_page(session, HelpRequest, columns, filters, limit, cursor, order)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return encode_response(request, rows, response)
+
+@app.get("/help-requests/{req_id}", response_model=HelpRequestOut)
+async def get_help_request(req_id: int, request: Request, response: Response, session: AsyncSession = Depends(get_db)):
+    """One help request; its ETag changes whenever the row is updated."""
+    req = await session.get(HelpRequest, req_id)
+    if not req:
+        raise HTTPException(status_code=404, detail="Request not found")
+    if (cached := conditional(request, response, row_etag("helprequest", req.id, req.version, representation(request)))) is not None:
+        return cached
+    return encode_response(request, row_values(req, parse_fields(HelpRequest, None)), response)
 
 # -------------------------
 # Supervisor responds -> updates request and optionally saves to KB
 # -------------------------
+def apply_supervisor_answer(req: HelpRequest, answer: SupervisorAnswer):
+    req.supervisor_response = answer.supervisor_response
+    req.status = answer.status
+    req.resolved_at = datetime.utcnow()
+    req.follow_up_sent = False
+
+def saves_to_kb(answer: SupervisorAnswer) -> bool:
+    # Policy: save to KB automatically when marked resolved OR if save_to_kb flag provided
+    return bool(answer.save_to_kb or answer.status == "resolved")
+
 @app.post("/help-requests/{req_id}/respond")
-def respond_help_request(req_id: int, answer: SupervisorAnswer):
-    with get_session() as session:
-        req = session.get(HelpRequest, req_id)
-        if not req:
+async def respond_help_request(req_id: int, answer: SupervisorAnswer, read: AsyncSession = Depends(get_db),
+                               session: AsyncSession = Depends(get_write_db)):
+    duplicates = None
+    if saves_to_kb(answer):
+        # fuzzy lookup first, outside the write transaction
+        question = (await read.exec(select(HelpRequest.question).where(HelpRequest.id == req_id))).first()
+        if question is None:
             raise HTTPException(status_code=404, detail="Request not found")
+        await read.close()
+        duplicates = await lookup_kb_duplicates([question])
+
+    req = await session.get(HelpRequest, req_id)
+    if not req:
+        raise HTTPException(status_code=404, detail="Request not found")
+
+    apply_supervisor_answer(req, answer)
+    kb = None
+    if saves_to_kb(answer):
+        kb, _ = await upsert_kb_answer(session, req.question, answer.supervisor_response, "SUPERVISOR", duplicates)
+    # the answer and its KB entry commit together: one transaction, one fsync
+    await session.commit()
+    if kb is not None:
+        await run_kb(kb_changed, kb)
+
+    return {"message": "Response recorded", "id": req.id}
+
+@app.post("/help-requests/respond/bulk", response_model=dict)
+async def respond_help_requests_bulk(payload: BulkRespond, read: AsyncSession = Depends(get_db),
+                                     session: AsyncSession = Depends(get_write_db)):
+    """
+    Apply many supervisor answers, and their KB writes, in one transaction:
+    either all are recorded or none (404 if any id does not exist).
+    """
+    answers = payload.answers
+    if len(answers) > RESPOND_BULK_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {RESPOND_BULK_MAX} answers per call")
+    ids = [a.id for a in answers]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Each request id may appear only once")
+
+    # fuzzy lookups first, on a read session: the write transaction below only runs indexed statements
+    kb_ids = [a.id for a in answers if saves_to_kb(a)]
+    questions = dict((await read.exec(select(HelpRequest.id, HelpRequest.question).where(HelpRequest.id.in_(kb_ids)))).all()) if kb_ids else {}
+    await read.close()
+    duplicates = await lookup_kb_duplicates(list(questions.values()))
 
-        req.supervisor_response = answer.supervisor_response
-        req.status = answer.status
-        req.resolved_at = datetime.utcnow()
-        req.follow_up_sent = False
-        session.add(req)
-        session.commit()
-        session.refresh(req)
-
-        # Policy: save to KB automatically when marked resolved OR if save_to_kb flag provided
-        if answer.save_to_kb or (answer.status == "resolved"):
-            kb = KnowledgeBase(
-                question_pattern=req.question,
-                answer=answer.supervisor_response,
-                source="SUPERVISOR"
-            )
-            session.add(kb)
-            session.commit()
-            session.refresh(kb)
-
-        return {"message": "Response recorded", "id": req.id}
+    reqs = {r.id: r for r in (await session.exec(select(HelpRequest).where(HelpRequest.id.in_(ids)))).all()} if ids else {}
+    missing = [i for i in ids if i not in reqs]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Requests not found: {', '.join(map(str, missing))}")
+
+    for a in answers:
+        apply_supervisor_answer(reqs[a.id], a)
+    saved = await upsert_kb_answers(
+        session, [(reqs[a.id].question, a.supervisor_response, "SUPERVISOR") for a in answers if saves_to_kb(a)], duplicates
+    )
+    # one commit: the request updates go out as one executemany, new KB rows as batched INSERTs
+    await session.commit()
+
+    kb_rows = list({id(kb): kb for kb, _ in saved}.values())
+    if kb_rows:
+        await run_kb(kb_changed, *kb_rows)
+    created = sum(1 for kb, c in saved if c)
+    return {"updated": len(ids), "ids": ids, "kb_created": created, "kb_updated": len(kb_rows) - created}
 
 # -------------------------
 # Agent follow-up simulation
 # -------------------------
 @app.post("/help-requests/{req_id}/agent-followup")
-def agent_followup(req_id: int):
-    with get_session() as session:
-        req = session.get(HelpRequest, req_id)
-        if not req:
-            raise HTTPException(status_code=404, detail="Request not found")
-        if not req.supervisor_response:
-            raise HTTPException(status_code=400, detail="No supervisor response to follow up with")
+async def agent_followup(req_id: int, session: AsyncSession = Depends(get_write_db)):
+    req = await session.get(HelpRequest, req_id)
+    if not req:
+        raise HTTPException(status_code=404, detail="Request not found")
+    if not req.supervisor_response:
+        raise HTTPException(status_code=400, detail="No supervisor response to follow up with")
 
-        req.follow_up_sent = True
-        session.add(req)
-        session.commit()
-        session.refresh(req)
+    req.follow_up_sent = True
+    session.add(req)
+    await session.commit()
 
-        follow_up_content = f"Hi {req.caller_name}, following up: {req.supervisor_response}"
-        return {"follow_up": follow_up_content}
+    follow_up_content = f"Hi {req.caller_name}, following up: {req.supervisor_response}"
+    return {"follow_up": follow_up_content}
+
+# -------------------------
+# Archive: closed requests moved out by the retention job
+# -------------------------
+@app.get("/archive/help-requests", response_model=List[ArchivedHelpRequestOut])
+async def list_archived_help_requests(
+    request: Request,
+    response: Response,
+    status: Optional[str] = None,
+    limit: int = Query(PAGE_LIMIT_DEFAULT, ge=1, le=PAGE_LIMIT_MAX),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    session: AsyncSession = Depends(get_db),
+):
+    """One page of archived help requests; same cursor / fields / order handling as GET /help-requests."""
+    columns = parse_fields(HelpRequestArchive, fields)
+    filters = [HelpRequestArchive.status == status] if status else []
+    rows, next_cursor = await fetch_page(session, HelpRequestArchive, columns, filters, limit, cursor, order)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return encode_response(request, rows, response)
+
+@app.get("/archive/help-requests/{req_id}", response_model=ArchivedHelpRequestOut)
+async def get_archived_help_request(req_id: int, request: Request, session: AsyncSession = Depends(get_db)):
+    req = await session.get(HelpRequestArchive, req_id)
+    if not req:
+        raise HTTPException(status_code=404, detail="Archived request not found")
+    return encode_response(request, row_values(req, parse_fields(HelpRequestArchive, None)))
+
+@app.post("/archive/run", response_model=dict)
+async def run_retention(older_than_days: float = Query(None, ge=0)):
+    """Archive closed requests older than `older_than_days` (default RETENTION_DAYS) now."""
+    days = RETENTION_DAYS if older_than_days is None else older_than_days
+    if days <= 0 and older_than_days is None:
+        raise HTTPException(status_code=400, detail="Retention is disabled (RETENTION_DAYS=0); pass older_than_days")
+    # DB-only work: the default thread pool, not kb_executor
+    moved = await asyncio.to_thread(archive_help_requests, get_session, days, batch_size=RETENTION_BATCH)
+    return {"archived": moved, "older_than_days": days}
+
+# -------------------------
+# Change feed: incremental sync of help requests and KB entries
+# -------------------------
+@app.get("/changes", response_model=ChangesOut)
+async def list_changes(
+    request: Request,
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=CHANGES_LIMIT_MAX),
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    Help requests and KB entries inserted or updated after cursor `since`
+    (current row state, oldest change first) plus ids deleted since. Pass the
+    returned `cursor` as the next `since`; `has_more` means call again now.
+    """
+    changes, has_more = await fetch_changes(session, since, limit)
+    hr_fields = parse_fields(HelpRequest, None)
+    kb_fields = parse_fields(KnowledgeBase, LEARNED_ANSWER_FIELDS + ",change_seq")
+    out = {"help_requests": [], "learned_answers": [], "deleted": []}
+    for seq, kind, obj in changes:
+        if kind == "helprequest":
+            out["help_requests"].append(row_values(obj, hr_fields))
+        elif kind == "knowledgebase":
+            out["learned_answers"].append(row_values(obj, kb_fields))
+        else:
+            out["deleted"].append({"table": obj.table_name, "id": obj.row_id, "change_seq": seq})
+    out["cursor"] = changes[-1][0] if changes else since
+    out["has_more"] = has_more
+    return encode_response(request, out)
+
+# -------------------------
+# Supervisor push notifications (Server-Sent Events)
+# -------------------------
+@app.get("/events")
+async def stream_events(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0),
+    heartbeat: float = Query(EVENTS_HEARTBEAT, ge=1, le=300),
+):
+    """
+    text/event-stream of request.created / request.resolved / request.updated /
+    kb.updated / *.deleted events, sent as their transactions commit. Event ids
+    are change_seq values: the first event ("hello") carries the current cursor;
+    a "resync" event means events were missed — catch up from
+    GET /changes?since=<its since>. Reconnecting clients pass Last-Event-ID (or ?since=).
+    """
+    last_id = request.headers.get("last-event-id")
+    if last_id is not None and last_id.isdigit():
+        since = int(last_id)
+    sub = event_bus.subscribe()
+    if sub is None:
+        raise HTTPException(status_code=503, detail="Too many event stream clients")
+    # subscribe first, then read the cursor: a commit in between is either
+    # covered by the cursor or delivered on the queue
+    # (no Depends session: it would stay checked out for the life of the stream)
+    try:
+        async with AsyncSession(async_engine) as session:
+            cursor = await table_version(session, CHANGE_SEQ)
+    except Exception:
+        event_bus.unsubscribe(sub)
+        raise
+    return StreamingResponse(
+        event_stream(sub, cursor, since, heartbeat),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/events/stats", response_model=dict)
+async def events_stats():
+    return event_bus.stats()
 
 # -------------------------
 # Knowledge Base endpoints
 # -------------------------
-@app.get("/learned-answers", response_model=List[dict])
-def list_learned_answers():
-    with get_session() as session:
-        rows = session.exec(select(KnowledgeBase)).all()
-        out = []
-        for r in rows:
-            out.append({
-                "id": r.id,
-                "question_pattern": r.question_pattern,
-                "answer": r.answer,
-                "created_at": r.created_at.isoformat() if r.created_at else None,
-                "updated_at": r.updated_at.isoformat() if r.updated_at else None,
-                "source": r.source
-            })
-        return out
+@app.get("/learned-answers", response_model=List[LearnedAnswerOut])
+async def list_learned_answers(
+    request: Request,
+    response: Response,
+    limit: int = Query(PAGE_LIMIT_DEFAULT, ge=1, le=PAGE_LIMIT_MAX),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    session: AsyncSession = Depends(get_db),
+):
+    """One page of KB entries; same cursor / fields / order / If-None-Match handling as GET /help-requests."""
+    columns = parse_fields(KnowledgeBase, fields or LEARNED_ANSWER_FIELDS)
+    version = await table_version(session, "knowledgebase")
+    etag = list_etag("knowledgebase", version, dict(limit=limit, cursor=cursor, fields=fields, order=order,
+                                                    fmt=representation(request)))
+    if (cached := conditional(request, response, etag)) is not None:
+        return cached
+    rows, next_cursor = await fetch_page(session, KnowledgeBase, columns, (), limit, cursor, order)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return encode_response(request, rows, response)
 
 @app.post("/learned-answers", response_model=dict)
-def create_learned_answer(payload: KBCreate):
-    with get_session() as session:
-        kb = KnowledgeBase(
-            question_pattern=payload.question_pattern,
-            answer=payload.answer,
-            source=payload.source
-        )
-        session.add(kb)
-        session.commit()
-        session.refresh(kb)
-        return {"id": kb.id, "message": "KB entry created"}
-
-@app.get("/kb/search", response_model=List[dict])
-def kb_search(q: str = Query(..., description="Query string to search KB"), top_k: int = 3, cutoff: float = 0.0):
-    results = find_kb_matches(q, top_k=top_k, cutoff=cutoff)
-    return results
+async def create_learned_answer(payload: KBCreate, session: AsyncSession = Depends(get_write_db)):
+    duplicates = await lookup_kb_duplicates([payload.question_pattern])
+    kb, created = await upsert_kb_answer(session, payload.question_pattern, payload.answer, payload.source, duplicates)
+    await session.commit()
+    await run_kb(kb_changed, kb)
+    if not created:
+        return {"id": kb.id, "message": "Existing KB entry updated (near-duplicate pattern)"}
+    return {"id": kb.id, "message": "KB entry created"}
+
+async def ndjson_lines(request: Request):
+    """(line number, raw line) of a streamed NDJSON request body, one chunk in memory at a time."""
+    buffer, number = b"", 0
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > KB_IMPORT_MAX_LINE:
+            raise HTTPException(status_code=413, detail=f"Line {number + len(lines) + 1} is longer than {KB_IMPORT_MAX_LINE} bytes")
+        for line in lines:
+            number += 1
+            yield number, line
+    if buffer:
+        yield number + 1, buffer
+
+@app.post("/learned-answers/import", response_model=dict)
+async def import_learned_answers(request: Request, dedupe: bool = True, session: AsyncSession = Depends(get_write_db)):
+    """
+    Bulk-load KB entries from an NDJSON body, one {"question_pattern", "answer",
+    "source"?} object per line (GET /learned-answers/export output works as is).
+    Rows are upserted like POST /learned-answers (dedupe=false skips the fuzzy
+    near-duplicate check; same-normalized patterns still update one row) and
+    committed every KB_IMPORT_BATCH lines; the KB index is updated once, at the end.
+    A bad line stops the import with 400; batches before it stay committed.
+    """
+    created = updated = 0
+    # index work for the end: the imported entries, or None once a rebuild is cheaper
+    entries: Optional[List[KBEntry]] = []
+    rebuild_above = max(KB_IMPORT_BATCH, len(kb_index) // 10)
+
+    async def flush(batch):
+        nonlocal created, updated, entries
+        # the session has no open transaction here (each batch commits): look up before writing
+        duplicates = await lookup_kb_duplicates([p for p, _, _ in batch]) if dedupe else None
+        saved = await upsert_kb_answers(session, batch, duplicates)
+        await session.commit()
+        rows = {id(kb): kb for kb, _ in saved}.values()
+        created += sum(1 for _, c in saved if c)
+        updated += len(rows) - sum(1 for _, c in saved if c)
+        if entries is not None:
+            entries.extend(KBEntry.from_row(kb) for kb in rows)
+            if len(entries) > rebuild_above:
+                entries = None
+
+    batch = []
+    try:
+        async for number, line in ndjson_lines(request):
+            if not line.strip():
+                continue
+            try:
+                item = KBCreate(**json.loads(line))
+            except (ValueError, TypeError, ValidationError) as e:
+                raise HTTPException(status_code=400, detail={"line": number, "error": str(e), "created": created, "updated": updated})
+            batch.append((item.question_pattern, item.answer, item.source or "MANUAL"))
+            if len(batch) >= KB_IMPORT_BATCH:
+                await flush(batch)
+                batch = []
+        if batch:
+            await flush(batch)
+    finally:
+        if created or updated:
+            await run_kb(kb_imported, entries)
+    return {"created": created, "updated": updated, "entries": len(kb_index)}
+
+@app.get("/learned-answers/export")
+async def export_learned_answers(fields: Optional[str] = None):
+    """
+    Every KB entry as NDJSON, oldest first, streamed from a server-side cursor
+    in KB_IMPORT_BATCH-row fetches (one read transaction: a consistent snapshot).
+    """
+    columns = parse_fields(KnowledgeBase, fields or LEARNED_ANSWER_FIELDS)
+    q = (
+        select(*(getattr(KnowledgeBase, f) for f in columns))
+        .order_by(KnowledgeBase.created_at, KnowledgeBase.id)
+        .execution_options(yield_per=KB_IMPORT_BATCH)
+    )
+
+    async def rows():
+        # own session: a Depends() session would be closed before the body is streamed
+        async with AsyncSession(async_engine) as session:
+            result = await session.stream(q)
+            async for part in result.partitions():
+                yield b"".join(dumps_json(row_values(r, columns)) + b"\n" for r in part)
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson",
+                             headers={"Content-Disposition": 'attachment; filename="learned-answers.ndjson"'})
+
+@app.post("/kb/compact", response_model=dict)
+async def kb_compact():
+    """Merge near-duplicate KB entries now, keeping the newest answer of each cluster."""
+    removed = await run_kb(run_kb_compaction)
+    return {"removed": len(removed), "removed_ids": removed, "entries": len(kb_index)}
+
+@app.get("/kb/stats", response_model=dict)
+async def kb_stats():
+    return {
+        "entries": len(kb_index),
+        "version": kb_index.version,
+        "matcher": type(kb_index).__name__,
+        "cutoffs": kb_index.default_cutoffs,
+        "cache": kb_cache.stats(),
+    }
+
+@app.post("/kb/snapshot", response_model=dict)
+async def kb_snapshot():
+    """Write a KB index snapshot now (normally done periodically and on shutdown)."""
+    if not KB_SNAPSHOT_DIR:
+        raise HTTPException(status_code=400, detail="KB snapshots are disabled (KB_SNAPSHOT_DIR is empty)")
+    path = await run_kb(save_kb_snapshot)
+    return {"path": path, "version": kb_index.version, "entries": len(kb_index)}
+
+@app.get("/kb/search", response_model=List[KBMatchOut])
+async def kb_search(request: Request, q: str = Query(..., description="Query string to search KB"), top_k: int = 3, cutoff: float = 0.0):
+    results = await find_kb_matches_async(q, top_k=top_k, cutoff=cutoff)
+    return encode_response(request, results)
+
+@app.post("/kb/search/batch", response_model=List[KBBatchResultOut])
+async def kb_search_batch(payload: KBBatchSearch, request: Request):
+    """Top-k KB matches for every query in one call, in request order."""
+    if len(payload.queries) > KB_SEARCH_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {KB_SEARCH_BATCH_MAX} queries per call")
+    if payload.top_k > KB_SEARCH_TOP_K_MAX:
+        raise HTTPException(status_code=400, detail=f"top_k may be at most {KB_SEARCH_TOP_K_MAX}")
+    batches = await run_kb(find_kb_matches_batch, payload.queries, top_k=payload.top_k, cutoff=payload.cutoff)
+    return encode_response(request, [{"query": q, "matches": m} for q, m in zip(payload.queries, batches)])
 
 
 
@@ -0,0 +1,117 @@
+# backend/migrations.py
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlmodel import Session, select
+
+from backend.models import SchemaMigration
+from backend.kb_index import normalize_text
+
+# SQLModel.metadata.create_all only creates missing tables; it never alters an
+# existing one. Schema changes to existing tables go here as numbered steps,
+# applied once (in order) by init_db() and recorded in schema_migrations.
+# Every step must be idempotent: on a fresh database create_all has already
+# built the current schema from backend/models.py.
+
+
+def _add_helprequest_indexes(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_helprequest_status ON helprequest (status)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_helprequest_created_at ON helprequest (created_at)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_helprequest_status_created_at ON helprequest (status, created_at)"))
+
+
+def _add_knowledgebase_normalized_pattern(conn, batch_size: int = 1000):
+    columns = {c["name"] for c in inspect(conn).get_columns("knowledgebase")}
+    if "normalized_pattern" not in columns:
+        conn.execute(text("ALTER TABLE knowledgebase ADD COLUMN normalized_pattern VARCHAR"))
+    while True:
+        rows = conn.execute(
+            text("SELECT id, question_pattern FROM knowledgebase WHERE normalized_pattern IS NULL LIMIT :n"),
+            {"n": batch_size},
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            text("UPDATE knowledgebase SET normalized_pattern = :p WHERE id = :id"),
+            [{"id": r.id, "p": normalize_text(r.question_pattern)} for r in rows],
+        )
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_knowledgebase_normalized_pattern ON knowledgebase (normalized_pattern)"))
+
+
+def _add_knowledgebase_created_at_id_index(conn):
+    # helprequest needs no such index: its integer id is the rowid, which every SQLite index already ends with
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_knowledgebase_created_at_id ON knowledgebase (created_at, id)"))
+
+
+def _create_table_version(conn):
+    # normally created by create_all (models.TableVersion); created here too so each step stands on its own
+    conn.execute(text("CREATE TABLE IF NOT EXISTS table_version (name VARCHAR NOT NULL PRIMARY KEY, version INTEGER NOT NULL)"))
+
+
+def _add_row_and_table_versions(conn):
+    columns = {c["name"] for c in inspect(conn).get_columns("helprequest")}
+    if "version" not in columns:
+        conn.execute(text("ALTER TABLE helprequest ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+    _create_table_version(conn)
+    for name in ("helprequest", "knowledgebase"):
+        conn.execute(
+            text("INSERT INTO table_version (name, version) SELECT :n, 0 WHERE NOT EXISTS (SELECT 1 FROM table_version WHERE name = :n)"),
+            {"n": name},
+        )
+
+
+def _add_change_seq(conn, batch_size: int = 1000):
+    # number existing rows in write order so a first GET /changes?since=0 returns everything
+    tables = {"helprequest": "COALESCE(resolved_at, created_at)", "knowledgebase": "updated_at"}
+    pending = []
+    for table, changed_at in tables.items():
+        columns = {c["name"] for c in inspect(conn).get_columns(table)}
+        if "change_seq" not in columns:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN change_seq INTEGER"))
+        rows = conn.execute(text(f"SELECT id, {changed_at} AS changed_at FROM {table} WHERE change_seq IS NULL")).all()
+        pending.extend((r.changed_at, table, r.id) for r in rows)
+    pending.sort(key=lambda p: (p[0] is None, p[0]))
+
+    seq = max(
+        conn.execute(text(f"SELECT MAX(change_seq) FROM {table}")).scalar() or 0 for table in tables
+    )
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        for table in tables:
+            params = [{"id": row_id, "seq": seq + start + i + 1} for i, (_, t, row_id) in enumerate(batch) if t == table]
+            if params:
+                conn.execute(text(f"UPDATE {table} SET change_seq = :seq WHERE id = :id"), params)
+    seq += len(pending)
+    _create_table_version(conn)
+    conn.execute(
+        text("INSERT INTO table_version (name, version) SELECT 'change_seq', :v WHERE NOT EXISTS (SELECT 1 FROM table_version WHERE name = 'change_seq')"),
+        {"v": seq},
+    )
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_helprequest_change_seq ON helprequest (change_seq)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_knowledgebase_change_seq ON knowledgebase (change_seq)"))
+
+
+# (version, name, step) — append only; never renumber or edit an applied step
+MIGRATIONS = [
+    (1, "helprequest status/created_at indexes", _add_helprequest_indexes),
+    (2, "knowledgebase normalized_pattern column + index", _add_knowledgebase_normalized_pattern),
+    (3, "knowledgebase (created_at, id) index", _add_knowledgebase_created_at_id_index),
+    (4, "helprequest.version column + table_version rows", _add_row_and_table_versions),
+    (5, "change_seq columns + counter", _add_change_seq),
+]
+
+
+def run_migrations(engine):
+    """Apply every migration not yet recorded in schema_migrations, each in its own transaction."""
+    with Session(engine) as session:
+        applied = set(session.exec(select(SchemaMigration.version)).all())
+
+    for version, name, step in MIGRATIONS:
+        if version in applied:
+            continue
+        with engine.begin() as conn:
+            step(conn)
+            conn.execute(
+                SchemaMigration.__table__.insert().values(version=version, name=name, applied_at=datetime.utcnow())
+            )
+        print(f"Applied migration {version}: {name}")
@@ -34,7 +34,7 @@
 
 from typing import Optional
 from datetime import datetime
-from sqlmodel import SQLModel, Field
+from sqlmodel import SQLModel, Field, Index
 import uuid
 
 
@@ -42,24 +42,96 @@ import uuid
 # Help Request Model
 # ------------------------------
 class HelpRequest(SQLModel, table=True):
+    # indexes are also created on existing databases by backend/migrations.py (same names)
+    __table_args__ = (Index("ix_helprequest_status_created_at", "status", "created_at"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     caller_name: str
     question: str
-    status: str = Field(default="pending")  # pending / resolved / unresolved
+    status: str = Field(default="pending", index=True)  # pending / resolved / unresolved
     supervisor_response: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
     resolved_at: Optional[datetime] = None
     livekit_room: Optional[str] = None
     follow_up_sent: bool = Field(default=False)
+    version: int = Field(default=1)  # bumped on every update (see backend/versioning.py); ETag of GET /help-requests/{id}
+    change_seq: Optional[int] = Field(default=None, index=True)  # position in the change feed (GET /changes)
+
+
+# ------------------------------
+# Archived help requests (moved out of helprequest by backend/retention.py)
+# ------------------------------
+class HelpRequestArchive(SQLModel, table=True):
+    __tablename__ = "helprequest_archive"
+    __table_args__ = (Index("ix_helprequest_archive_status_created_at", "status", "created_at"),)
+
+    id: int = Field(primary_key=True)  # the original HelpRequest.id
+    caller_name: str
+    question: str
+    status: str
+    supervisor_response: Optional[str] = None
+    created_at: datetime = Field(index=True)
+    resolved_at: Optional[datetime] = None
+    livekit_room: Optional[str] = None
+    follow_up_sent: bool = Field(default=False)
+    archived_at: datetime = Field(default_factory=datetime.utcnow)
 
 
 # ------------------------------
 # Knowledge Base Model
 # ------------------------------
 class KnowledgeBase(SQLModel, table=True):
+    # keyset pagination order of GET /learned-answers (also created by backend/migrations.py)
+    __table_args__ = (Index("ix_knowledgebase_created_at_id", "created_at", "id"),)
+
     id: str = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True)
     question_pattern: str
     answer: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     source: str = Field(default="SEED")
+    normalized_pattern: Optional[str] = Field(default=None, index=True)  # kb_index.normalize_text(question_pattern)
+    change_seq: Optional[int] = Field(default=None, index=True)  # position in the change feed (GET /changes)
+
+
+# ------------------------------
+# KB Embedding Model (vectors for the semantic KB matcher)
+# ------------------------------
+class KBEmbedding(SQLModel, table=True):
+    kb_id: str = Field(primary_key=True)  # KnowledgeBase.id
+    model: str  # embedder that produced the vector; vectors from other models are recomputed
+    dim: int
+    vector: bytes  # float32, L2-normalized
+
+
+# ------------------------------
+# Applied schema migrations (see backend/migrations.py)
+# ------------------------------
+class SchemaMigration(SQLModel, table=True):
+    __tablename__ = "schema_migrations"
+
+    version: int = Field(primary_key=True)
+    name: str
+    applied_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+# ------------------------------
+# Per-table change counters (ETags of the list endpoints, see backend/versioning.py)
+# ------------------------------
+class TableVersion(SQLModel, table=True):
+    __tablename__ = "table_version"
+
+    name: str = Field(primary_key=True)
+    version: int = Field(default=0)
+
+
+# ------------------------------
+# Deleted rows, kept so change-feed clients can drop them from their mirrors
+# ------------------------------
+class ChangeTombstone(SQLModel, table=True):
+    __tablename__ = "change_tombstone"
+
+    seq: int = Field(primary_key=True)  # change_seq of the deletion
+    table_name: str
+    row_id: str
+    deleted_at: datetime = Field(default_factory=datetime.utcnow)
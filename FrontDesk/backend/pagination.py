@@ -0,0 +1,93 @@
+# backend/pagination.py
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import literal, tuple_
+from sqlmodel import select
+
+# Keyset ("seek") pagination on (created_at, id): each page is one index range
+# scan starting right after the last row of the previous page, so the cost of
+# a page depends on its size, not on how deep into the table it is.
+
+PAGE_LIMIT_MAX = 500
+
+
+def encode_cursor(created_at: datetime, row_id) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), row_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_fields(model, fields: Optional[str]) -> List[str]:
+    """Comma-separated column names -> validated list (all columns when empty)."""
+    columns = list(model.__table__.columns.keys())
+    if not fields:
+        return columns
+    wanted = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in wanted if f not in columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(columns)}")
+    return wanted
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def row_dict(row, fields: Sequence[str]) -> dict:
+    """JSON-ready dict of one ORM row."""
+    return {f: _json_value(getattr(row, f)) for f in fields}
+
+
+def row_values(row, fields: Sequence[str]) -> dict:
+    """Dict of one ORM row's raw column values (datetimes left to the encoder, see backend/serialization.py)."""
+    return {f: getattr(row, f) for f in fields}
+
+
+async def fetch_page(session, model, fields: Sequence[str], filters=(), limit: int = 50,
+               cursor: Optional[str] = None, order: str = "asc"):
+    """
+    One page of `model` rows ordered by (created_at, id), selecting only `fields`.
+    Returns (rows as dicts of raw column values, cursor of the next page or None).
+    """
+    created_at, row_id = model.created_at, model.id
+    # the key columns are always selected (they make the next cursor) but only returned if asked for
+    columns = [getattr(model, f) for f in fields if f not in ("created_at", "id")] + [created_at, row_id]
+    q = select(*columns)
+    for condition in filters:
+        q = q.where(condition)
+
+    key = tuple_(created_at, row_id)
+    if cursor:
+        after_created, after_id = decode_cursor(cursor)
+        # bind with the column types so the values are stored-format compatible (SQLite compares text)
+        after = tuple_(literal(after_created, created_at.type), literal(after_id, row_id.type))
+        q = q.where(key < after if order == "desc" else key > after)
+    if order == "desc":
+        q = q.order_by(created_at.desc(), row_id.desc())
+    else:
+        q = q.order_by(created_at, row_id)
+
+    # one extra row tells whether another page exists
+    rows = (await session.exec(q.limit(limit + 1))).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]._mapping
+        next_cursor = encode_cursor(last["created_at"], last["id"])
+    # positions of the requested fields in the selected row tuple
+    at = {c.key: i for i, c in enumerate(columns)}
+    picks = [at[f] for f in fields]
+    out = [dict(zip(fields, [r[i] for i in picks])) for r in rows]
+    return out, next_cursor
@@ -0,0 +1,79 @@
+# backend/serialization.py
+import gzip
+import json
+import os
+from datetime import datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+# Fast path for the large read responses (lists, change feed, KB search): the
+# handlers return rows as plain dicts of column values and this module encodes
+# them once, straight to bytes, instead of FastAPI validating the return value
+# against the response model and running jsonable_encoder over every field.
+# - JSON via orjson when installed (datetimes are encoded natively, same
+#   ISO format as .isoformat()); the json module otherwise.
+# - msgpack when the client sends Accept: application/msgpack and the msgpack
+#   package is installed.
+# - gzip when the client accepts it and the body is at least GZIP_MIN_SIZE.
+#   Applied here rather than with GZipMiddleware, which would also buffer the
+#   streaming responses (/events, exports) inside the compressor.
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the json module
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional: msgpack is only offered when installed
+    msgpack = None
+
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))  # 0 disables gzip
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "1"))
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def dumps_json(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def wants_msgpack(request: Request) -> bool:
+    accept = request.headers.get("accept", "")
+    return msgpack is not None and any(t in accept for t in MSGPACK_TYPES)
+
+
+def representation(request: Request) -> str:
+    """Media type this request will get; part of the list and row ETags (each representation has its own)."""
+    return "msgpack" if wants_msgpack(request) else "json"
+
+
+def encode_response(request: Request, data, response: Optional[Response] = None, status_code: int = 200) -> Response:
+    """
+    Encode `data` for `request` (see module comment). Headers already set on
+    the handler's injected `response` (ETag, X-Next-Cursor, ...) are carried over.
+    """
+    if wants_msgpack(request):
+        body, media_type = msgpack.packb(data, default=_default, use_bin_type=True), "application/msgpack"
+    else:
+        body, media_type = dumps_json(data), "application/json"
+    headers = {k: v for k, v in response.headers.items() if k != "content-length"} if response is not None else {}
+    vary = ["Accept"]
+    if GZIP_MIN_SIZE and len(body) >= GZIP_MIN_SIZE and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+        # a different byte sequence: the validator becomes weak (If-None-Match compares weakly anyway)
+        if headers.get("etag", "").startswith('"'):
+            headers["etag"] = "W/" + headers["etag"]
+    if GZIP_MIN_SIZE:
+        vary.append("Accept-Encoding")
+    headers["Vary"] = ", ".join(vary)
+    return Response(content=body, status_code=status_code, headers=headers, media_type=media_type)
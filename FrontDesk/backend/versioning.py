@@ -0,0 +1,133 @@
+# backend/versioning.py
+import hashlib
+from typing import Iterable, Optional
+
+import heapq
+from datetime import datetime
+
+from sqlalchemy import event, insert, update
+from sqlalchemy.orm import Session as ORMSession
+from sqlmodel import select
+
+from backend.events import queue_deletions
+from backend.models import ChangeTombstone, HelpRequest, KnowledgeBase, TableVersion
+
+# Change counters behind the strong ETags of the read endpoints and the change feed:
+# - HelpRequest.version: per row, bumped whenever the row is updated;
+# - table_version: per table, bumped by every transaction that inserts,
+#   updates or deletes rows of that table;
+# - change_seq: one global sequence (the "change_seq" row of table_version);
+#   every inserted/updated row takes the next value and every deleted row
+#   leaves a ChangeTombstone with one. The counter row is updated inside the
+#   writing transaction, so sequence order is commit order (writers serialize
+#   on it) and a reader never sees seq N+1 committed before seq N.
+# ORM writes are counted automatically (before_flush hook below, for sync and
+# async sessions alike); bulk statements must call bump_table_versions() and,
+# for deletes, record_deletions(). Both paths also queue the /events
+# notifications (backend/events.py) that go out when the transaction commits.
+
+VERSIONED = {HelpRequest: "helprequest", KnowledgeBase: "knowledgebase"}
+CHANGE_SEQ = "change_seq"
+
+
+def bump_table_versions(session, names: Iterable[str]):
+    # Core statement on the session's connection: no autoflush, safe inside a flush hook
+    conn = session.connection()
+    for name in sorted(set(names)):
+        conn.execute(update(TableVersion.__table__).where(TableVersion.name == name).values(version=TableVersion.version + 1))
+
+
+def next_change_seqs(session, n: int) -> range:
+    """Reserve `n` consecutive change sequence numbers in the session's transaction."""
+    conn = session.connection()
+    top = conn.execute(
+        update(TableVersion.__table__).where(TableVersion.name == CHANGE_SEQ)
+        .values(version=TableVersion.version + n).returning(TableVersion.version)
+    ).scalar_one()
+    return range(top - n + 1, top + 1)
+
+
+def record_deletions(session, table_name: str, row_ids: Iterable):
+    """Tombstones for rows removed outside the ORM unit of work (bulk deletes)."""
+    row_ids = [str(i) for i in row_ids]
+    if not row_ids:
+        return
+    now = datetime.utcnow()
+    rows = [
+        {"seq": seq, "table_name": table_name, "row_id": row_id, "deleted_at": now}
+        for seq, row_id in zip(next_change_seqs(session, len(row_ids)), row_ids)
+    ]
+    session.connection().execute(insert(ChangeTombstone.__table__), rows)
+    queue_deletions(session, table_name, [(r["seq"], r["row_id"]) for r in rows])
+
+
+@event.listens_for(ORMSession, "before_flush")
+def _count_changes(session, flush_context, instances):
+    touched, changed, deleted = set(), [], []
+    for obj in session.new:
+        if type(obj) in VERSIONED:
+            touched.add(VERSIONED[type(obj)])
+            changed.append(obj)
+    for obj in session.dirty:
+        if type(obj) in VERSIONED and session.is_modified(obj):
+            touched.add(VERSIONED[type(obj)])
+            changed.append(obj)
+            if isinstance(obj, HelpRequest):
+                obj.version = (obj.version or 0) + 1
+    for obj in session.deleted:
+        if type(obj) in VERSIONED:
+            touched.add(VERSIONED[type(obj)])
+            deleted.append(obj)
+    if not touched:
+        return
+    bump_table_versions(session, touched)
+    if changed:
+        for obj, seq in zip(changed, next_change_seqs(session, len(changed))):
+            obj.change_seq = seq
+    for obj in deleted:
+        record_deletions(session, VERSIONED[type(obj)], [obj.id])
+
+
+async def table_version(session, name: str) -> int:
+    return (await session.exec(select(TableVersion.version).where(TableVersion.name == name))).one_or_none() or 0
+
+
+def list_etag(name: str, version: int, params: dict) -> str:
+    """Strong ETag of a list response: table version + the query parameters that shape the page."""
+    shape = "&".join(f"{k}={params[k]}" for k in sorted(params) if params[k] is not None)
+    return f'"{name}-{version}-{hashlib.sha1(shape.encode("utf-8")).hexdigest()[:12]}"'
+
+
+def row_etag(name: str, row_id, version: int, fmt: Optional[str] = None) -> str:
+    """Strong ETag of one row; `fmt` (the negotiated representation) keeps JSON and msgpack bodies apart."""
+    return f'"{name}-{row_id}-v{version}-{fmt}"' if fmt else f'"{name}-{row_id}-v{version}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison (RFC 9110 13.1.2), so W/ prefixes are ignored."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+async def fetch_changes(session, since: int, limit: int):
+    """
+    Up to `limit` changes after `since`, oldest first, as (seq, kind, row)
+    with kind "helprequest", "knowledgebase" or "deleted" (a ChangeTombstone
+    row). Rows are plain column tuples (attribute access by column name), not
+    ORM objects. Returns (changes, has_more). All reads run in the session's
+    one transaction.
+    """
+    sources = []
+    for kind, model, seq_col in (
+        ("helprequest", HelpRequest, HelpRequest.change_seq),
+        ("knowledgebase", KnowledgeBase, KnowledgeBase.change_seq),
+        ("deleted", ChangeTombstone, ChangeTombstone.seq),
+    ):
+        q = select(*model.__table__.columns).where(seq_col > since).order_by(seq_col).limit(limit + 1)
+        rows = (await session.exec(q)).all()
+        sources.append([(getattr(r, seq_col.key), kind, r) for r in rows])
+    merged = list(heapq.merge(*sources, key=lambda change: change[0]))
+    return merged[:limit], len(merged) > limit
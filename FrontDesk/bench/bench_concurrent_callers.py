@@ -0,0 +1,126 @@
+# bench/bench_concurrent_callers.py
+"""
+Many simultaneous callers against a live backend process.
+
+    python bench/bench_concurrent_callers.py [callers] [requests_per_caller]
+
+Starts uvicorn on a throwaway SQLite database and seeds a few KB entries, then:
+
+1. throughput: `callers` concurrent clients alternate POST /agent/ask and
+   GET /help-requests?limit=20;
+2. stalled writers: another process holds the SQLite write lock for a few
+   seconds while `callers` clients escalate (each waits on the lock), and
+   GET /kb/search is probed meanwhile. With sync handlers the waiting
+   writers occupy every threadpool thread and the probe stalls with them;
+   async handlers keep serving it.
+"""
+import asyncio
+import os
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def caller(client, n, requests_per_caller, latencies, failures):
+    for i in range(requests_per_caller):
+        t0 = time.perf_counter()
+        try:
+            if i % 2:
+                r = await client.get("/help-requests", params={"limit": 20, "order": "desc"})
+            else:
+                r = await client.post("/agent/ask", json={"caller_name": f"caller {n}", "question": "what are your opening hours?"})
+            r.raise_for_status()
+            latencies.append((time.perf_counter() - t0) * 1000)
+        except Exception:
+            failures.append(n)
+
+
+def hold_write_lock(db_path, seconds):
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("BEGIN IMMEDIATE")
+    time.sleep(seconds)
+    conn.execute("COMMIT")
+    conn.close()
+
+
+async def probe(client, latencies, stop):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        (await client.get("/kb/search", params={"q": "opening hours"})).raise_for_status()
+        latencies.append((time.perf_counter() - t0) * 1000)
+        await asyncio.sleep(0.05)
+
+
+async def run(base_url, db_path, callers, requests_per_caller, lock_seconds=3.0):
+    limits = httpx.Limits(max_connections=callers + 1, max_keepalive_connections=callers + 1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        for pattern, answer in [("What are your opening hours?", "9 to 5"), ("Where do I park?", "Lot B")]:
+            await client.post("/learned-answers", json={"question_pattern": pattern, "answer": answer})
+
+        latencies, failures = [], []
+        t0 = time.perf_counter()
+        await asyncio.gather(*(caller(client, n, requests_per_caller, latencies, failures) for n in range(callers)))
+        elapsed = time.perf_counter() - t0
+        q = statistics.quantiles(latencies, n=100)
+        print(f"throughput: {callers} callers x {requests_per_caller} requests: {len(latencies) / elapsed:.0f} req/s, "
+              f"p50 {q[49]:.1f} ms, p95 {q[94]:.1f} ms, p99 {q[98]:.1f} ms, failed {len(failures)}")
+
+        probe_latencies, stop = [], asyncio.Event()
+        locker = asyncio.get_running_loop().run_in_executor(None, hold_write_lock, db_path, lock_seconds)
+        await asyncio.sleep(0.2)
+        prober = asyncio.create_task(probe(client, probe_latencies, stop))
+        escalations = [
+            client.post("/agent/ask", json={"caller_name": f"caller {n}", "question": f"unusual question {n}?"})
+            for n in range(callers)
+        ]
+        responses = (await asyncio.gather(locker, *escalations))[1:]
+        stop.set()
+        await prober
+    failed = sum(1 for r in responses if r.status_code != 200)
+    print(f"stalled writers: {callers} escalations behind a {lock_seconds:.0f}s write lock ({failed} failed); "
+          f"/kb/search probe median {statistics.median(probe_latencies):.1f} ms, max {max(probe_latencies):.1f} ms "
+          f"({len(probe_latencies)} probes)")
+
+
+def main():
+    callers = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    requests_per_caller = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", KB_SNAPSHOT_DIR="", SQLITE_BUSY_TIMEOUT_MS="30000")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning",
+             "--backlog", "4096"],
+            cwd=ROOT, env=env,
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            for _ in range(100):
+                try:
+                    httpx.get(base_url + "/kb/stats", timeout=1)
+                    break
+                except httpx.HTTPError:
+                    time.sleep(0.2)
+            asyncio.run(run(base_url, db_path, callers, requests_per_caller))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# bench/bench_concurrent_writers.py
+"""
+Concurrent writers against SQLite: the bare engine (no pragmas, rollback
+journal) vs the engine profile from backend/db.py (WAL, synchronous=NORMAL,
+busy_timeout, pooled connections, BEGIN IMMEDIATE for write sessions).
+
+    python bench/bench_concurrent_writers.py [writers] [ops_per_writer] [readers]
+
+Each writer thread mimics the agent / supervisor mix: create a help request,
+or read a pending one and resolve it. Reader threads page through the list
+meanwhile. Reports throughput, latency percentiles and failed transactions.
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlmodel import SQLModel, Session, create_engine, select  # noqa: E402
+
+from backend.db import create_db_engine  # noqa: E402
+from backend.models import HelpRequest  # noqa: E402
+
+
+def writer(engine, ops, latencies, errors, seed):
+    rnd = random.Random(seed)
+    for i in range(ops):
+        t0 = time.perf_counter()
+        try:
+            with Session(engine) as session:
+                if rnd.random() < 0.5:
+                    session.add(HelpRequest(caller_name=f"caller {seed}", question=f"question {seed}-{i}"))
+                else:
+                    req = session.exec(
+                        select(HelpRequest).where(HelpRequest.status == "pending").order_by(HelpRequest.created_at.desc()).limit(1)
+                    ).first()
+                    if req:
+                        req.status = "resolved"
+                        req.supervisor_response = "done"
+                        session.add(req)
+                session.commit()
+            latencies.append((time.perf_counter() - t0) * 1000)
+        except OperationalError as e:
+            errors.append(str(e.orig))
+
+
+def reader(engine, stop):
+    while not stop.is_set():
+        with Session(engine) as session:
+            session.exec(select(HelpRequest).order_by(HelpRequest.created_at.desc()).limit(50)).all()
+
+
+def run(label, engine, write_engine, writers, ops, readers):
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for i in range(1000):
+            session.add(HelpRequest(caller_name="seed", question=f"seed {i}"))
+        session.commit()
+
+    latencies, errors, stop = [], [], threading.Event()
+    threads = [threading.Thread(target=writer, args=(write_engine, ops, latencies, errors, n)) for n in range(writers)]
+    reader_threads = [threading.Thread(target=reader, args=(engine, stop)) for _ in range(readers)]
+    for t in reader_threads:
+        t.start()
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    for t in reader_threads:
+        t.join()
+    engine.dispose()
+
+    ok = len(latencies)
+    q = statistics.quantiles(latencies, n=100) if ok > 1 else [0] * 99
+    print(f"{label:<10}{ok / elapsed:>10.0f}{q[49]:>10.1f}{q[94]:>10.1f}{q[98]:>10.1f}{len(errors):>8}")
+    if errors:
+        print(f"          e.g. {errors[0]}")
+
+
+def main():
+    writers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    ops = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    readers = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    print(f"{writers} writers x {ops} transactions, {readers} readers\n")
+    print(f"{'engine':<10}{'tx/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'failed':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bare.db')}"
+        bare = create_engine(url, connect_args={"check_same_thread": False})
+        run("bare", bare, bare, writers, ops, readers)
+
+        # WAL without BEGIN IMMEDIATE: read-then-write transactions can fail on a stale snapshot
+        deferred = create_db_engine(f"sqlite:///{os.path.join(tmp, 'deferred.db')}")
+        run("wal-defer", deferred, deferred, writers, ops, readers)
+
+        tuned = create_db_engine(f"sqlite:///{os.path.join(tmp, 'tuned.db')}")
+        run("tuned", tuned, tuned.execution_options(sqlite_begin="IMMEDIATE"), writers, ops, readers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# bench/bench_kb_index.py
+"""
+Difflib KB search latency as the KB grows.
+
+    python bench/bench_kb_index.py [sizes]      (default 5000,20000,50000)
+
+Builds a DifflibKBIndex over `size` synthetic question patterns (FAQ-style
+templates filled from a word list, so grams like "wha" / "you" are in most
+rows) and times a fixed set of queries, once with the bounded candidate pool
+and once walking every posting list (the pre-pool behaviour). The last column
+is how often both return the same top match. Per-query time with the pool
+should stay roughly flat while the unbounded column grows with the KB.
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backend.kb_index import DifflibKBIndex, KBEntry  # noqa: E402
+
+TEMPLATES = [
+    "what are your hours on {w}",
+    "do you have {w} available",
+    "how much does a {w} cost",
+    "can i book a {w} for {v}",
+    "where is the {w} located",
+    "are you open for {w} on {v}",
+    "what is your policy on {w}",
+    "do you offer {w} with {v}",
+]
+
+
+def words(count: int, rng: random.Random):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(count)]
+
+
+def patterns(size: int, vocab, rng: random.Random):
+    return [rng.choice(TEMPLATES).format(w=rng.choice(vocab), v=rng.choice(vocab)) for _ in range(size)]
+
+
+def time_queries(index, queries, repeat: int = 3):
+    per_query = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        results = [index.search(q, top_k=3, cutoff=0.45) for q in queries]
+        per_query.append((time.perf_counter() - t0) / len(queries))
+    return statistics.median(per_query), [r[0][0].id if r else None for r in results]
+
+
+def bench():
+    sizes = [int(s) for s in (sys.argv[1] if len(sys.argv) > 1 else "5000,20000,50000").split(",")]
+    rng = random.Random(7)
+    vocab = words(5000, rng)
+    print(f"{'rows':>8} {'pooled ms/query':>16} {'unbounded ms/query':>19} {'same top match':>15}")
+    for size in sizes:
+        rows = patterns(size, vocab, rng)
+        entries = [KBEntry(id=str(i), question_pattern=p, answer="a") for i, p in enumerate(rows)]
+        # queries: existing rows with a typo, plus generic phrasings
+        queries = [q[:5] + q[6:] for q in rng.sample(rows, 40)] + ["what are your hours", "do you have parking"]
+        pooled, unbounded = DifflibKBIndex(), DifflibKBIndex(max_pool=10 ** 9)
+        pooled.rebuild(entries)
+        unbounded.rebuild(entries)
+        t_pooled, top_pooled = time_queries(pooled, queries)
+        t_full, top_full = time_queries(unbounded, queries)
+        same = sum(a == b for a, b in zip(top_pooled, top_full)) / len(queries)
+        print(f"{size:>8} {t_pooled * 1000:>16.2f} {t_full * 1000:>19.2f} {same:>14.0%}")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,82 @@
+# bench/bench_serialization.py
+"""
+Response encoding throughput of the list and search endpoints.
+
+    python bench/bench_serialization.py [rows] [seconds]    (default 5000 rows, 3 s per case)
+
+Runs the app in-process on a throwaway SQLite database filled with `rows`
+help requests and KB entries, then calls each endpoint back to back for
+`seconds` (no ETag revalidation, so every call builds and encodes the body)
+and prints requests/s and body size. Cases with an Accept-Encoding or Accept
+header show the negotiated encodings.
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = "sqlite:///" + tempfile.mktemp(suffix=".db")
+os.environ.setdefault("KB_SNAPSHOT_DIR", "")
+os.environ.setdefault("KB_CACHE_SIZE", "0")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from backend import main  # noqa: E402
+from backend.db import get_session  # noqa: E402
+from backend.models import HelpRequest, KnowledgeBase  # noqa: E402
+
+CASES = [
+    ("GET /help-requests limit=500", "/help-requests", {"limit": 500}, {}),
+    ("  + gzip", "/help-requests", {"limit": 500}, {"Accept-Encoding": "gzip"}),
+    ("  + msgpack", "/help-requests", {"limit": 500}, {"Accept": "application/msgpack"}),
+    ("GET /learned-answers limit=500", "/learned-answers", {"limit": 500}, {}),
+    ("GET /changes limit=1000", "/changes", {"since": 0, "limit": 1000}, {}),
+    ("GET /kb/search top_k=50", "/kb/search", {"q": "question about parking 7", "top_k": 50}, {}),
+]
+
+
+def populate(rows: int):
+    start = datetime.utcnow() - timedelta(days=30)
+    with get_session(write=True) as session:
+        for i in range(rows):
+            session.add(HelpRequest(
+                caller_name=f"caller {i}", question=f"question about parking {i}", status="resolved" if i % 3 else "pending",
+                supervisor_response=f"answer number {i}", created_at=start + timedelta(seconds=i), resolved_at=start + timedelta(seconds=i + 60),
+            ))
+            session.add(KnowledgeBase(question_pattern=f"question about parking {i}", normalized_pattern=f"question about parking {i}",
+                                      answer=f"lot {i % 7}", created_at=start + timedelta(seconds=i)))
+        session.commit()
+
+
+def run(client, path, params, headers, seconds):
+    n, size, deadline = 0, 0, time.perf_counter() + seconds
+    t0 = time.perf_counter()
+    while time.perf_counter() < deadline:
+        resp = client.get(path, params=params, headers={"Accept-Encoding": "identity", **headers})
+        resp.raise_for_status()
+        n += 1
+        size = int(resp.headers.get("content-length") or len(resp.content))
+    return n / (time.perf_counter() - t0), size
+
+
+def bench():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+    with TestClient(main.app) as client:
+        populate(rows)
+        main.load_kb_index()
+        print(f"{rows} rows per table")
+        for name, path, params, headers in CASES:
+            rps, size = run(client, path, params, headers, seconds)
+            print(f"{name:34s} {rps:8.1f} req/s  {size / 1024:8.1f} KiB  ({describe(client, path, params, headers)})")
+
+
+def describe(client, path, params, headers):
+    resp = client.get(path, params=params, headers={"Accept-Encoding": "identity", **headers})
+    return f"{resp.headers.get('content-type')}, {resp.headers.get('content-encoding', 'identity')}"
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,102 @@
+# bench/bench_status_filter.py
+"""
+HelpRequest filter latency with and without the migration indexes.
+
+    python bench/bench_status_filter.py [rows]      (default 1,000,000)
+
+Builds a throwaway SQLite database, fills it with `rows` help requests
+(~5% pending), times the queries the API and UI run, then applies the index
+migrations from backend/migrations.py (INDEX_MIGRATIONS) and times them again.
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from backend.migrations import MIGRATIONS  # noqa: E402
+
+# the migration steps that add indexes; later steps add columns this minimal schema does not model
+INDEX_MIGRATIONS = (1, 2, 3)
+
+QUERIES = {
+    "pending newest 50": "SELECT * FROM helprequest WHERE status = 'pending' ORDER BY created_at DESC LIMIT 50",
+    "count pending": "SELECT COUNT(*) FROM helprequest WHERE status = 'pending'",
+    "resolved last hour": "SELECT * FROM helprequest WHERE status = 'resolved' AND created_at >= :since",
+    "newest 50": "SELECT * FROM helprequest ORDER BY created_at DESC LIMIT 50",
+}
+
+
+def populate(engine, rows: int):
+    statuses = ["pending"] * 5 + ["resolved"] * 80 + ["unresolved"] * 15
+    start = datetime.utcnow() - timedelta(days=365)
+    step = timedelta(days=365) / rows
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE helprequest (id INTEGER PRIMARY KEY, caller_name VARCHAR NOT NULL, "
+            "question VARCHAR NOT NULL, status VARCHAR NOT NULL, supervisor_response VARCHAR, "
+            "created_at DATETIME NOT NULL)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE knowledgebase (id VARCHAR PRIMARY KEY, question_pattern VARCHAR NOT NULL, "
+            "answer VARCHAR NOT NULL, created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL, source VARCHAR NOT NULL)"
+        ))
+        insert = text(
+            "INSERT INTO helprequest (caller_name, question, status, created_at) VALUES (:c, :q, :s, :t)"
+        )
+        batch = []
+        for i in range(rows):
+            batch.append({"c": f"caller {i % 997}", "q": f"question number {i}", "s": random.choice(statuses), "t": start + step * i})
+            if len(batch) == 50_000:
+                conn.execute(insert, batch)
+                batch = []
+        if batch:
+            conn.execute(insert, batch)
+
+
+def measure(engine, repeat: int = 5):
+    since = datetime.utcnow() - timedelta(hours=1)
+    results = {}
+    with engine.connect() as conn:
+        for name, sql in QUERIES.items():
+            timings = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                conn.execute(text(sql), {"since": since}).all()
+                timings.append((time.perf_counter() - t0) * 1000)
+            results[name] = statistics.median(timings)
+    return results
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    random.seed(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        t0 = time.perf_counter()
+        populate(engine, rows)
+        print(f"populated {rows:,} rows in {time.perf_counter() - t0:.1f}s")
+
+        before = measure(engine)
+        t0 = time.perf_counter()
+        with engine.begin() as conn:
+            for version, _, step in MIGRATIONS:
+                if version in INDEX_MIGRATIONS:
+                    step(conn)
+        print(f"index migrations applied in {time.perf_counter() - t0:.1f}s")
+        after = measure(engine)
+        engine.dispose()
+
+    print(f"\n{'query':<22}{'no index (ms)':>15}{'indexed (ms)':>15}{'speedup':>10}")
+    for name in QUERIES:
+        print(f"{name:<22}{before[name]:>15.2f}{after[name]:>15.2f}{before[name] / max(after[name], 1e-6):>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
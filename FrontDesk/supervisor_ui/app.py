@@ -3,10 +3,12 @@ import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import streamlit as st
 import requests
+import json
+import time
 from dotenv import load_dotenv
 from typing import Optional
-import re 
-from agent_voice.speech import speak
+from agent_voice.speech import speak, stop_speaking
+from agent_voice.tts import kb_answer_text
 import speech_recognition as sr
 
 
@@ -14,6 +16,12 @@ import speech_recognition as sr
 load_dotenv()  # loads supervisor_ui/.env if present, or project root .env
 
 BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:8000")
+# rows per page when listing requests / KB entries (the backend pages its list endpoints)
+UI_PAGE_SIZE = int(os.getenv("UI_PAGE_SIZE", "100"))
+# responses kept for If-None-Match revalidation (per browser session)
+ETAG_CACHE_SIZE = 64
+# seconds to wait on the backend /events stream before re-rendering anyway
+UI_LIVE_WAIT = float(os.getenv("UI_LIVE_WAIT", "60"))
 
 # Utility function to build absolute backend endpoints
 def backend_url(path: str) -> str:
@@ -42,6 +50,8 @@ with col3:
             st.rerun()
         except Exception:
             st.info("Please manually refresh the page.")
+    st.toggle("Live updates", value=True, key="live_updates",
+              help="Re-render as soon as the backend pushes a change (GET /events) instead of waiting for a manual refresh.")
 
 # -------------------------
 # Tabs: Supervisor | Agent Simulator
@@ -51,32 +61,57 @@ tabs = st.tabs(["Supervisor", "Agent Simulator", "Logs / Debug"])
 # -------------------------
 # Helper functions (API wrappers)
 # -------------------------
-def fetch_requests(status: Optional[str] = None):
+def get_json_cached(path: str, params: Optional[dict] = None, timeout: int = 8):
     """
-    Fetch help requests from backend.
+    GET a JSON endpoint, revalidating with If-None-Match. Bodies are kept per
+    (path, params) in session state, so an unchanged resource (304) costs the
+    backend no serialization and the wire no body. Returns (body, headers).
+    """
+    cache = st.session_state.setdefault("etag_cache", {})
+    key = (path, tuple(sorted((params or {}).items())))
+    headers = {"If-None-Match": cache[key][0]} if key in cache else {}
+    resp = requests.get(backend_url(path), params=params, headers=headers, timeout=timeout)
+    if resp.status_code == 304 and key in cache:
+        return cache[key][1], cache[key][2]
+    resp.raise_for_status()
+    body, resp_headers = resp.json(), resp.headers.copy()
+    etag = resp.headers.get("ETag")
+    if etag:
+        if len(cache) >= ETAG_CACHE_SIZE:
+            cache.pop(next(iter(cache)))
+        cache[key] = (etag, body, resp_headers)
+    return body, resp_headers
+
+def fetch_requests(status: Optional[str] = None, limit: int = UI_PAGE_SIZE, order: str = "desc",
+                   fields: Optional[str] = None, cursor: Optional[str] = None):
+    """
+    Fetch one page of help requests from backend (newest first by default).
     If status is provided, backend will filter by that (pending/resolved/unresolved).
+    Returns (rows, next_cursor); next_cursor is None on the last page.
     """
     try:
-        params = {}
+        params = {"limit": limit, "order": order}
         if status:
             params["status"] = status
-        resp = requests.get(backend_url("/help-requests"), params=params, timeout=8)
-        resp.raise_for_status()
-        return resp.json()
+        if fields:
+            params["fields"] = fields
+        if cursor:
+            params["cursor"] = cursor
+        rows, headers = get_json_cached("/help-requests", params)
+        return rows, headers.get("X-Next-Cursor")
     except Exception as e:
         st.error(f"Failed to fetch requests: {e}")
-        return []
+        return [], None
 
 def get_request_by_id(req_id: int):
-    """
-    Helper to fetch a single request from the list (backend doesn't provide /help-requests/{id} GET in the minimal API),
-    so we re-fetch all and filter locally.
-    """
-    rows = fetch_requests()
-    for r in rows:
-        if r["id"] == req_id:
-            return r
-    return None
+    """Fetch a single request via GET /help-requests/{id} (None if it does not exist)."""
+    try:
+        row, _ = get_json_cached(f"/help-requests/{req_id}")
+        return row
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return None
+        raise
 
 def post_supervisor_response(req_id: int, response_text: str, status: str, save_to_kb: bool = False):
     """
@@ -97,13 +132,6 @@ def trigger_agent_followup(req_id: int):
     r.raise_for_status()
     return r.json()
 
-def create_help_request(caller_name: str, question: str, livekit_room: Optional[str] = None):
-    """Call backend to create a help request (simulating agent escalation)."""
-    payload = {"caller_name": caller_name, "question": question, "livekit_room": livekit_room}
-    r = requests.post(backend_url("/help-requests"), json=payload, timeout=8)
-    r.raise_for_status()
-    return r.json()
-
 def request_livekit_token(identity: str, room: Optional[str] = None):
     """Request a token from backend /token?identity=...&room=..."""
     params = {"identity": identity}
@@ -116,25 +144,68 @@ def request_livekit_token(identity: str, room: Optional[str] = None):
 # -------------------------
 # Knowledge Base helpers
 # -------------------------
-def kb_search(query: str, top_k: int = 3):
-    """Query backend KB search endpoint: /kb/search?q=..."""
+def agent_ask(caller_name: str, question: str, kb_cutoff: float, livekit_room: Optional[str] = None, top_k: int = 5):
+    """
+    One call per caller turn via POST /agent/ask: the backend searches the KB, applies
+    the keyword relevance gate and escalates if needed. Returns decision "answer" or "escalated".
+    """
+    payload = {"caller_name": caller_name, "question": question, "livekit_room": livekit_room,
+               "kb_cutoff": kb_cutoff, "top_k": top_k}
+    r = requests.post(backend_url("/agent/ask"), json=payload, timeout=8)
+    r.raise_for_status()
+    return r.json()
+
+def list_kb(limit: int = UI_PAGE_SIZE):
+    """List the newest learned answers via GET /learned-answers"""
     try:
-        r = requests.get(backend_url("/kb/search"), params={"q": query, "top_k": top_k}, timeout=8)
-        r.raise_for_status()
-        return r.json()
+        rows, _ = get_json_cached("/learned-answers", {"limit": limit, "order": "desc"})
+        return rows
     except Exception as e:
-        st.error(f"KB search failed: {e}")
+        st.error(f"Failed to fetch KB entries: {e}")
         return []
 
-def list_kb():
-    """List all learned answers via GET /learned-answers"""
+def agent_kb_cutoff(fallback: float = 0.75) -> float:
+    """The backend KB engine's default /agent/ask cutoff (scores are on that engine's scale)."""
     try:
-        r = requests.get(backend_url("/learned-answers"), timeout=8)
-        r.raise_for_status()
-        return r.json()
+        stats = requests.get(backend_url("/kb/stats"), timeout=8).json()
+        return float(stats["cutoffs"]["agent"])
+    except Exception:
+        return fallback
+
+def wait_for_backend_event(timeout_s: float = UI_LIVE_WAIT) -> bool:
+    """
+    Block on the backend's /events stream until a change is pushed (True) or
+    timeout_s passes (False). The stream is asked for 1s keepalives; the status
+    line is redrawn on each one, which lets Streamlit cut the wait short as soon
+    as the user interacts with the page.
+    """
+    status = st.empty()
+    params = {"heartbeat": 1}
+    if st.session_state.get("last_event_seq") is not None:
+        # anything committed since the last event we saw comes back as a "resync"
+        params["since"] = st.session_state["last_event_seq"]
+    deadline = time.monotonic() + timeout_s
+    kind = None
+    try:
+        with requests.get(backend_url("/events"), params=params, stream=True, timeout=(5, 10)) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines(decode_unicode=True):
+                status.caption("Live: waiting for backend changes…")
+                if line.startswith("id:"):
+                    st.session_state["last_event_seq"] = int(line[3:].strip())
+                elif line.startswith("event:"):
+                    kind = line[6:].strip()
+                elif line.startswith("data:") and kind not in (None, "hello"):
+                    data = json.loads(line[5:])
+                    if kind == "resync":
+                        st.session_state["last_event_seq"] = data.get("cursor", st.session_state.get("last_event_seq"))
+                    return True
+                if time.monotonic() >= deadline:
+                    return False
     except Exception as e:
-        st.error(f"Failed to fetch KB entries: {e}")
-        return []
+        status.caption(f"Live updates unavailable: {e}")
+        time.sleep(min(5.0, timeout_s))
+    return False
 
 # -------------------------
 # Tab: Supervisor
@@ -154,10 +225,22 @@ with tabs[0]:
     with right:
         st.write("Click a request to open details below and respond.")
 
-    # Fetch requests from backend
-    requests_list = fetch_requests(None if status_filter == "all" else status_filter)
-
-    st.subheader(f"Requests ({len(requests_list)})")
+    # Fetch requests from backend: pending oldest first (longest waiting on top), the rest newest first.
+    # "Load more" adds a page; pages already shown revalidate with their ETag.
+    order = "asc" if status_filter == "pending" else "desc"
+    if st.session_state.get("requests_view") != (status_filter, order):
+        st.session_state["requests_view"] = (status_filter, order)
+        st.session_state["requests_pages"] = 1
+    requests_list, next_cursor = [], None
+    for _ in range(st.session_state["requests_pages"]):
+        rows, next_cursor = fetch_requests(None if status_filter == "all" else status_filter, order=order, cursor=next_cursor)
+        requests_list.extend(rows)
+        if not next_cursor:
+            break
+
+    shown = "oldest first" if order == "asc" else "newest first"
+    more = ", more available" if next_cursor else ""
+    st.subheader(f"Requests ({len(requests_list)}, {shown}{more})")
     # Display summary table (two columns)
     for req in requests_list:
         # Each request is displayed in an expander for compactness.
@@ -198,6 +281,10 @@ with tabs[0]:
                 else:
                     st.write("No LiveKit room attached.")
 
+    if next_cursor and st.button(f"Load {UI_PAGE_SIZE} more"):
+        st.session_state["requests_pages"] += 1
+        st.rerun()
+
     st.markdown("---")
     # Detailed response pane for selected request (if any)
     sel_id = st.session_state.get("selected_request")
@@ -250,9 +337,10 @@ with col_a:
         "KB auto-reply threshold (0-1)",
         min_value=0.0,
         max_value=1.0,
-        value=0.75,
+        value=agent_kb_cutoff(),
         step=0.05,
-        help="If KB match score >= threshold, treat as confident answer and don't escalate."
+        help="If KB match score >= threshold, treat as confident answer and don't escalate. "
+             "Defaults to the backend KB engine's own cutoff (TF-IDF scores run on another scale than difflib)."
     )
 
 with col_b:
@@ -262,6 +350,7 @@ with col_b:
         st.session_state.voice_input = ""
 
     if st.button("🎤 Record / Stop Voice"):
+        stop_speaking()  # barge-in: don't talk over the caller (or record ourselves)
         r = sr.Recognizer()
         with sr.Microphone() as source:
             st.info("Listening... Speak now.")
@@ -275,48 +364,31 @@ with col_b:
                 # Confirm what was heard
                 speak(f"You said: {text}")
 
-                # 🔹 Auto-check Knowledge Base
+                # 🔹 Auto-check Knowledge Base (search, relevance check and escalation in one backend call)
                 st.info("Checking Knowledge Base for an answer...")
-                kb_results = kb_search(text, top_k=5)
-
-                if not kb_results:
-                    st.warning("No KB entries found. Escalating to supervisor.")
-                    speak("I don’t know the answer. Forwarding this to the supervisor.")
-                    try:
-                        r = create_help_request(caller_name, text, livekit_room=room_name or None)
-                        st.success(f"Created help request ID: {r.get('id')}")
-                    except Exception as e:
-                        st.error(f"Failed to create help request: {e}")
+                try:
+                    result = agent_ask(caller_name, text, kb_cutoff, livekit_room=room_name or None)
+                except Exception as e:
+                    st.error(f"Failed to check KB / create help request: {e}")
                     st.stop()
 
-                # Function to check basic relevance
-                def is_relevant(user_q, kb_q):
-                    import re
-                    user_words = set(re.findall(r"\w+", user_q.lower()))
-                    kb_words = set(re.findall(r"\w+", kb_q.lower()))
-                    stopwords = {"the", "is", "and", "a", "an", "to", "for", "in", "of", "on", "are", "you", "we", "do", "have"}
-                    overlap = (user_words - stopwords) & (kb_words - stopwords)
-                    return len(overlap) >= 2
-
-                # Analyze top KB match
-                top = kb_results[0]
+                top = result.get("kb_match") or result.get("kb_suggestion") or {}
                 top_score = top.get("score", 0)
-                top_question = top.get("question_pattern", "")
-                top_answer = top.get("answer", "")
 
                 # Decide based on confidence
-                if top_score >= kb_cutoff and is_relevant(text, top_question):
+                if result.get("decision") == "answer":
+                    top_answer = result.get("answer", "")
                     st.success(f"KB match confident (score {top_score:.2f}) — replying automatically.")
                     st.info(f"Agent reply: {top_answer}")
-                    speak(f"Here's what I found: {top_answer}")
+                    speak(kb_answer_text(top_answer))
+                elif not result.get("suggestions"):
+                    st.warning("No KB entries found. Escalating to supervisor.")
+                    speak("I don’t know the answer. Forwarding this to the supervisor.")
+                    st.success(f"Created help request ID: {result.get('id')}")
                 else:
                     st.warning("Low confidence. Escalating to supervisor.")
                     speak("I’m not sure about that. I’ll forward this question to the supervisor.")
-                    try:
-                        r = create_help_request(caller_name, text, livekit_room=room_name or None)
-                        st.success(f"Help request ID {r.get('id')} created.")
-                    except Exception as e:
-                        st.error(f"Failed to create help request: {e}")
+                    st.success(f"Help request ID {result.get('id')} created.")
 
             except sr.WaitTimeoutError:
                 st.warning("No voice detected, please try again.")
@@ -338,26 +410,19 @@ with col_b:
     # ✅ keep all logic indented under the same tab
     with c1:
 
-        def is_relevant(user_q, kb_q):
-            """Simple relevance check based on common keywords."""
-            user_words = set(re.findall(r"\w+", user_q.lower()))
-            kb_words = set(re.findall(r"\w+", kb_q.lower()))
-            stopwords = {"the", "is", "and", "a", "an", "to", "for", "in", "of", "on", "are", "you", "we", "do", "have"}
-            overlap = (user_words - stopwords) & (kb_words - stopwords)
-            return len(overlap) >= 2  # at least 2 common keywords = relevant
-
         if st.button("Check KB & (maybe) escalate"):
-            kb_results = kb_search(question, top_k=5)
+            try:
+                result = agent_ask(caller_name, question, kb_cutoff, livekit_room=room_name or None)
+            except Exception as e:
+                st.error(f"Failed to check KB / create help request: {e}")
+                st.stop()
 
+            kb_results = result.get("suggestions") or []
             if not kb_results:
                 st.info("No KB matches found. Creating help request.")
-                try:
-                    r = create_help_request(caller_name, question, livekit_room=room_name or None)
-                    st.success(f"Created new help request ID: {r.get('id')}")
-                    st.write("Now switch to Supervisor tab to respond.")
-                    speak("I could not find an answer. I have sent your question to the supervisor.")  # 👈 Voice feedback
-                except Exception as e:
-                    st.error(f"Failed to create help request: {e}")
+                st.success(f"Created new help request ID: {result.get('id')}")
+                st.write("Now switch to Supervisor tab to respond.")
+                speak("I could not find an answer. I have sent your question to the supervisor.")  # 👈 Voice feedback
                 st.stop()
 
             # Show KB results
@@ -368,25 +433,19 @@ with col_b:
                 st.write("Answer:", s.get("answer"))
                 st.write("---")
 
-            top = kb_results[0]
-            top_score = top.get("score", 0)
-            top_question = top.get("question_pattern", "")
-            top_answer = top.get("answer", "")
+            top_score = kb_results[0].get("score", 0)
 
-            if top_score >= kb_cutoff and is_relevant(question, top_question):
+            if result.get("decision") == "answer":
+                top_answer = result.get("answer", "")
                 st.success(f"Top KB match is confident (score {top_score:.2f}). Agent can auto-reply.")
                 st.info("Agent replied with:")
                 st.write(top_answer)
-                speak(f"Here's what I found: {top_answer}")  # Voice feedback (non-blocking)
+                speak(kb_answer_text(top_answer))  # Voice feedback (non-blocking)
             else:
                 st.warning(f"Low confidence (score {top_score:.2f}). Escalating to Supervisor.")
-                try:
-                    r = create_help_request(caller_name, question, livekit_room=room_name or None)
-                    st.success(f"Created help request ID: {r.get('id')}")
-                    st.info("Supervisor will review this soon.")
-                    speak("I'm not sure about the answer. Sending your question to the supervisor.")
-                except Exception as e:
-                    st.error(f"Failed to create help request: {e}")
+                st.success(f"Created help request ID: {result.get('id')}")
+                st.info("Supervisor will review this soon.")
+                speak("I'm not sure about the answer. Sending your question to the supervisor.")
 
 
     with c2:
@@ -408,11 +467,11 @@ with col_b:
 
     st.markdown("---")
     st.write("Quick log: Last 5 pending requests")
-    pending = fetch_requests("pending")
+    pending, _ = fetch_requests("pending", limit=5, fields="id,caller_name,question")
     if not pending:
         st.info("No pending requests found.")
     else:
-        for r in pending[-5:]:
+        for r in pending:
             st.write(f"ID {r['id']} — {r['caller_name']} — {r['question'][:80]}...")
 
 # -------------------------
@@ -423,7 +482,7 @@ with tabs[2]:
     st.write("This page is for quick debugging and manual requests.")
     st.subheader("Backend health check")
     try:
-        health = requests.get(backend_url("/help-requests"), timeout=5)
+        health = requests.get(backend_url("/help-requests"), params={"limit": 1, "fields": "id"}, timeout=5)
         st.success(f"Backend reachable (GET /help-requests returned {health.status_code})")
     except Exception as e:
         st.error(f"Backend unreachable: {e}")
@@ -440,7 +499,6 @@ with tabs[2]:
             else:
                 # try parse JSON body, fallback to raw string
                 try:
-                    import json
                     parsed = json.loads(body)
                 except Exception:
                     parsed = body
@@ -465,12 +523,10 @@ with tabs[2]:
     except Exception as e:
         st.error(f"Failed to fetch KB entries: {e}")
 
-
-
-
-
-
-
-
-
-
+# -------------------------
+# Live updates: the page re-renders when the backend pushes a change
+# (list reads revalidate with ETags, so an unrelated change costs 304s)
+# -------------------------
+if st.session_state.get("live_updates", True):
+    wait_for_backend_event()
+    st.rerun()
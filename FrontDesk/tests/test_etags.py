@@ -0,0 +1,23 @@
+# tests/test_etags.py
+"""ETags are per representation: a JSON body never validates a msgpack one."""
+import pytest
+
+
+def new_request(client, question="Do you have a dress code?"):
+    return client.post("/help-requests", params={"kb_cutoff": 1.01}, json={"caller_name": "Ana", "question": question}).json()
+
+
+def test_row_etag_revalidates_the_same_representation(client):
+    req = new_request(client)
+    first = client.get(f"/help-requests/{req['id']}")
+    etag = first.headers["etag"]
+    assert client.get(f"/help-requests/{req['id']}", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_row_etag_differs_between_json_and_msgpack(client):
+    pytest.importorskip("msgpack")
+    req = new_request(client)
+    json_etag = client.get(f"/help-requests/{req['id']}").headers["etag"]
+    packed = client.get(f"/help-requests/{req['id']}", headers={"Accept": "application/msgpack", "If-None-Match": json_etag})
+    assert packed.status_code == 200
+    assert packed.headers["etag"] != json_etag
@@ -0,0 +1,29 @@
+# tests/test_kb_cutoffs.py
+"""Default KB cutoffs come from the engine, since each engine scores on its own scale."""
+from backend import main
+from backend.kb_index import KBEntry
+from backend.kb_tfidf import TfidfKBIndex
+
+FAQ = ["What are your hours on Monday?", "What are your hours?", "Do you take walk-ins?", "Where can I park my car",
+       "How much is a haircut?", "Can I book an appointment online?", "Do you take credit cards?",
+       "Do you offer gel nails?", "Is there wheelchair access?", "Do you sell gift cards?",
+       "What is your cancellation policy?"]
+
+
+def test_stats_report_the_engine_defaults(client):
+    assert client.get("/kb/stats").json()["cutoffs"] == main.kb_index.default_cutoffs
+
+
+def test_tfidf_defaults_are_applied_when_no_cutoff_is_given(client, monkeypatch):
+    index = TfidfKBIndex()
+    index.rebuild(KBEntry(id=str(i), question_pattern=p, answer=f"answer {i}") for i, p in enumerate(FAQ))
+    monkeypatch.setattr(main, "kb_index", index)
+    main.kb_cache.invalidate()
+    try:
+        assert main.kb_cutoff_or_default(None, "agent") == TfidfKBIndex.default_cutoffs["agent"]
+        assert main.kb_cutoff_or_default(0.9, "agent") == 0.9
+        # 0.69 with tfidf: answered at its "agent" default (0.65); the difflib default (0.75) would escalate
+        r = client.post("/agent/ask", json={"caller_name": "Ana", "question": "how much for a haircut"}).json()
+        assert r["decision"] == "answer" and r["answer"] == "answer 4"
+    finally:
+        main.kb_cache.invalidate()
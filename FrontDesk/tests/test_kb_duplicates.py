@@ -0,0 +1,85 @@
+# tests/test_kb_duplicates.py
+"""
+Learned answers are merged only when two patterns ask the same question:
+similar wording with different keywords ("hours on Sunday" vs "hours on
+Monday") must stay two rows, both when a supervisor answer is saved and when
+the KB is compacted.
+"""
+import os
+import sqlite3
+
+from backend import main
+from backend.kb_index import DifflibKBIndex, KBEntry, normalize_text, similarity
+
+MONDAY = "What are your hours on Monday?"
+SUNDAY = "What are your hours on Sunday?"
+
+
+def kb_rows(client):
+    return {r["question_pattern"]: r["answer"] for r in client.get("/learned-answers", params={"limit": 500}).json()}
+
+
+def test_similar_wording_with_other_keywords_is_not_a_duplicate():
+    # the pair is above the default threshold on wording alone
+    assert similarity(normalize_text(SUNDAY), normalize_text(MONDAY)) >= 0.92
+    index = DifflibKBIndex()
+    index.rebuild([KBEntry(id="mon", question_pattern=MONDAY, answer="9 to 5")])
+    assert index.find_duplicate(SUNDAY) is None
+    assert index.find_duplicate("what are your hours on monday").id == "mon"
+
+
+def test_resolving_sunday_keeps_the_monday_answer(client):
+    client.post("/learned-answers", json={"question_pattern": MONDAY, "answer": "9 to 5"}).raise_for_status()
+    # kb_cutoff > 1: always escalate (the Monday row would otherwise be offered as the answer)
+    req = client.post("/help-requests", params={"kb_cutoff": 1.01}, json={"caller_name": "Ana", "question": SUNDAY}).json()
+    client.post(f"/help-requests/{req['id']}/respond",
+                json={"supervisor_response": "Closed on Sundays", "status": "resolved"}).raise_for_status()
+
+    rows = kb_rows(client)
+    assert rows[MONDAY] == "9 to 5"
+    assert rows[SUNDAY] == "Closed on Sundays"
+
+
+def test_compaction_keeps_both_days_and_merges_real_duplicates(client):
+    client.post("/learned-answers", json={"question_pattern": "Where can I park my car", "answer": "Lot A"}).raise_for_status()
+    # same keywords as the row above: saved as a separate row only because the fuzzy check is skipped on import
+    client.post("/learned-answers/import", params={"dedupe": "false"},
+                content='{"question_pattern": "Where can I park my car??", "answer": "Lot B"}\n').raise_for_status()
+    assert "Where can I park my car??" in kb_rows(client)
+
+    removed = main.run_kb_compaction()
+
+    rows = kb_rows(client)
+    assert len(removed) == 1
+    assert MONDAY in rows and SUNDAY in rows
+    assert [q for q in rows if q.startswith("Where can I park")] == ["Where can I park my car??"]
+
+
+def test_duplicate_lookups_run_before_the_write_lock_is_taken(client, monkeypatch):
+    database = os.environ["DATABASE_URL"][len("sqlite:///"):]
+    lock_free = []
+
+    def find_kb_duplicates(patterns):
+        # BEGIN IMMEDIATE with no busy wait fails while another connection holds the write lock
+        conn = sqlite3.connect(database, timeout=0, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("ROLLBACK")
+            lock_free.append(True)
+        except sqlite3.OperationalError:
+            lock_free.append(False)
+        finally:
+            conn.close()
+        return [main.find_kb_duplicate(p) for p in patterns]
+
+    monkeypatch.setattr(main, "find_kb_duplicates", find_kb_duplicates)
+    reqs = [client.post("/help-requests", params={"kb_cutoff": 1.01}, json={"caller_name": "Ana", "question": q}).json()
+            for q in ("Do you validate parking tickets?", "Is there a kids menu?")]
+    client.post(f"/help-requests/{reqs[0]['id']}/respond",
+                json={"supervisor_response": "Yes, at the desk", "status": "resolved"}).raise_for_status()
+    client.post("/help-requests/respond/bulk",
+                json={"answers": [{"id": reqs[1]["id"], "supervisor_response": "Yes", "status": "resolved"}]}).raise_for_status()
+    client.post("/learned-answers/import", content='{"question_pattern": "Do you deliver?", "answer": "No"}\n').raise_for_status()
+
+    assert lock_free == [True, True, True]
+    assert kb_rows(client)["Do you validate parking tickets?"] == "Yes, at the desk"
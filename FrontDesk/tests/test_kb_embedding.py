@@ -0,0 +1,24 @@
+# tests/test_kb_embedding.py
+"""Embedding KB index: default embedder and snapshot export."""
+from backend.kb_embedding import EmbeddingKBIndex, HashingEmbedder, create_embedder
+from backend.kb_index import KBEntry, create_kb_index
+
+
+def test_default_embedder_needs_no_extra_packages(monkeypatch):
+    monkeypatch.delenv("KB_EMBED_MODEL", raising=False)
+    assert isinstance(create_embedder(), HashingEmbedder)
+    index = create_kb_index("embedding")
+    index.rebuild([KBEntry(id="1", question_pattern="Do you take walk-ins?", answer="Yes")])
+    assert index.search("do you take walk ins", cutoff=0.5)[0][0].id == "1"
+
+
+def test_exported_vectors_are_not_changed_by_later_writes():
+    index = EmbeddingKBIndex(HashingEmbedder())
+    index.rebuild([KBEntry(id=str(i), question_pattern=p, answer="a")
+                   for i, p in enumerate(["Do you take walk-ins?", "Where can I park?", "Is there wifi?"])])
+    payload, arrays = index.export_state()
+    saved = arrays["vectors"].copy()
+    # swap-remove moves the last row into the freed slot; an upsert appends in place
+    index.remove("0")
+    index.upsert(KBEntry(id="3", question_pattern="Do you sell gift cards?", answer="a"))
+    assert (arrays["vectors"] == saved).all()
@@ -0,0 +1,42 @@
+# tests/test_kb_index.py
+"""
+The difflib index only narrows the rows to score: its results must be the
+ones the old full scan (difflib.get_close_matches over every pattern) gave.
+"""
+import difflib
+
+from backend.kb_index import DifflibKBIndex, KBEntry
+
+PATTERNS = [
+    "Do you take walk-ins?",
+    "What are your hours on Monday?",
+    "What are your hours on Sunday?",
+    "Where can I park my car",
+    "Do you offer gel nails?",
+    "How much is a haircut?",
+    "Can I book an appointment online?",
+    "Do you take credit cards?",
+]
+QUERIES = ["do you do nails", "What are your hours?", "hours?", "Where do I park", "HOW MUCH IS A HAIRCUT",
+           "can i book online", "credit card"]
+
+
+def full_scan(query, top_k, cutoff):
+    close = difflib.get_close_matches(query, PATTERNS, n=top_k, cutoff=cutoff)
+    scores = [(p, round(difflib.SequenceMatcher(None, query, p).ratio(), 3)) for p in close]
+    return sorted(scores, key=lambda s: s[1], reverse=True)
+
+
+def test_scores_match_the_full_scan():
+    index = DifflibKBIndex()
+    index.rebuild(KBEntry(id=str(i), question_pattern=p, answer="a") for i, p in enumerate(PATTERNS))
+    for query in QUERIES:
+        for cutoff in (0.45, 0.55, 0.75):
+            got = [(e.question_pattern, round(s, 3)) for e, s in index.search(query, top_k=3, cutoff=cutoff)]
+            assert got == full_scan(query, 3, cutoff), (query, cutoff)
+
+
+def test_unrelated_question_stays_below_the_escalation_cutoff():
+    index = DifflibKBIndex()
+    index.rebuild([KBEntry(id="walkins", question_pattern="Do you take walk-ins?", answer="Yes")])
+    assert index.search("do you do nails", cutoff=0.55) == []
@@ -0,0 +1,19 @@
+# tests/test_kb_search_batch.py
+"""POST /kb/search/batch is bounded and does not flush the single-query cache."""
+from backend import main
+
+
+def test_batch_limits(client):
+    too_many = client.post("/kb/search/batch", json={"queries": ["q"] * (main.KB_SEARCH_BATCH_MAX + 1)})
+    assert too_many.status_code == 400
+    too_deep = client.post("/kb/search/batch", json={"queries": ["q"], "top_k": main.KB_SEARCH_TOP_K_MAX + 1})
+    assert too_deep.status_code == 400
+
+
+def test_batch_results_are_not_cached(client):
+    client.get("/kb/search", params={"q": "Is there a kids menu?"}).raise_for_status()
+    size = main.kb_cache.stats()["size"]
+    queries = [f"unrelated question number {i}" for i in range(main.KB_SEARCH_BATCH_MAX)]
+    r = client.post("/kb/search/batch", json={"queries": queries})
+    assert [b["query"] for b in r.json()] == queries
+    assert main.kb_cache.stats()["size"] == size
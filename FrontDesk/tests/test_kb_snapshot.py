@@ -0,0 +1,31 @@
+# tests/test_kb_snapshot.py
+"""
+A KB snapshot's watermark is what the index has applied, not what the DB has
+committed: rows committed but not yet in the index when the snapshot was
+taken (an import still running) are replayed when it is restored.
+"""
+from backend import main
+from backend.db import get_session
+from backend.models import KnowledgeBase
+
+
+def test_restore_replays_rows_committed_but_not_yet_indexed(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "KB_SNAPSHOT_DIR", str(tmp_path))
+    client.post("/learned-answers", json={"question_pattern": "Is there wheelchair access?", "answer": "Yes"}).raise_for_status()
+    # committed, but its index update has not run yet
+    with get_session(write=True) as session:
+        pending = KnowledgeBase(question_pattern="Can I bring my own cake?", normalized_pattern="can i bring my own cake?", answer="For a fee")
+        session.add(pending)
+        session.commit()
+        pending_id = pending.id
+    # a later write reaches the index first
+    client.post("/learned-answers", json={"question_pattern": "Do you sell gift cards?", "answer": "At the desk"}).raise_for_status()
+    assert pending_id not in main.kb_index
+
+    main.save_kb_snapshot()
+    main.kb_index.rebuild([])
+    assert main.restore_kb_snapshot()
+
+    assert pending_id in main.kb_index
+    assert main.kb_index.get(pending_id).answer == "For a fee"
+    assert len(main.kb_index) == len(client.get("/learned-answers", params={"limit": 500}).json())
@@ -0,0 +1,14 @@
+# tests/test_token_batch.py
+"""POST /token/batch returns exactly one token per requested identity."""
+
+
+def test_repeated_identity_is_rejected(client):
+    r = client.post("/token/batch", json={"identities": ["agent-1", "agent-2", "agent-1"], "room": "front"})
+    assert r.status_code == 400
+
+
+def test_one_token_per_identity_in_request_order(client):
+    identities = ["agent-9", "agent-1", "agent-5"]
+    r = client.post("/token/batch", json={"identities": identities, "room": "front"})
+    r.raise_for_status()
+    assert [t["identity"] for t in r.json()["tokens"]] == identities